@@ -0,0 +1,22 @@
+import os
+import threading
+
+def write_atomic(path, write, mode='wb', encoding=None, mtime_ns=None):
+    # Write `path` through a temporary file next to it, so readers never see
+    # it half written. `write(f)` fills the file, `mtime_ns` is stamped on it.
+    # Returns False when it can't be written, a read-only install for example,
+    # callers then keep what they have in memory.
+    temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(temp_path, mode, encoding=encoding) as f:
+            write(f)
+        if mtime_ns is not None:
+            os.utime(temp_path, ns=(mtime_ns, mtime_ns))
+        os.replace(temp_path, path)
+        return True
+    except OSError:
+        return False
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
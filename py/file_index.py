@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+
+# In-memory listings of the LoRA, embedding and group folders, so searching
+# and browsing them doesn't walk the disk on every keystroke. A directory is
+# listed the first time it is visited and relisted only when its mtime moves.
+INDEX_CHECK_INTERVAL = 5.0
+# A listing taken this soon after its directory changed is taken again on the
+# next check, mtimes can't tell two changes within one timestamp tick apart
+MTIME_SETTLE_SECONDS = 2.0
+# Preview images are listed too, so /erenodes/view can answer from memory
+PREVIEW_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+
+class DirListing:
+    __slots__ = ("mtime_ns", "listed_at", "files", "folders", "images", "stats")
+
+    def __init__(self, mtime_ns, listed_at, files, folders, images):
+        self.mtime_ns = mtime_ns
+        self.listed_at = listed_at
+        # (name without extension, extension, lowercase name)
+        self.files = files
+        # (name, is_symlink), os.walk lists symlinked folders but doesn't enter them
+        self.folders = folders
+        # os.path.normcase(name) -> name, matching isfile() on case-insensitive systems
+        self.images = images
+        # name -> (size, mtime), filled on demand by FileIndex.file_stat
+        self.stats = {}
+
+class FileIndex:
+    def __init__(self, extensions):
+        self.extensions = extensions
+        self.dirs = {}
+        self.checked = 0.0
+        self.lock = threading.RLock()
+
+    def list_dir(self, path):
+        # Stat before listing, a change while listing then shows up as a newer mtime
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+            listed_at = time.time()
+            files = []
+            folders = []
+            images = {}
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        folders.append((entry.name, entry.is_symlink()))
+                    else:
+                        lower = entry.name.lower()
+                        if lower.endswith(self.extensions):
+                            name, ext = os.path.splitext(entry.name)
+                            files.append((name, ext, name.lower()))
+                        if lower.endswith(PREVIEW_EXTENSIONS):
+                            images[os.path.normcase(entry.name)] = entry.name
+        except OSError:
+            return None
+        return DirListing(mtime_ns, listed_at, files, folders, images)
+
+    def listing(self, path):
+        # Listing of an absolute directory path, None if it isn't a readable directory
+        with self.lock:
+            listing = self.dirs.get(path)
+            if listing is None:
+                listing = self.list_dir(path)
+                if listing is not None:
+                    self.dirs[path] = listing
+            return listing
+
+    def file_stat(self, dirpath, filename):
+        # (size, mtime) of a listed file, stat'ed once per listing
+        listing = self.listing(dirpath)
+        if listing is None:
+            return None
+        stat = listing.stats.get(filename)
+        if stat is None:
+            try:
+                st = os.stat(os.path.join(dirpath, filename))
+            except OSError:
+                return None
+            stat = listing.stats[filename] = (st.st_size, st.st_mtime)
+        return stat
+
+    def find_preview(self, path_base):
+        # Same order as probing isfile() on "<base><ext>" then "<base>.preview<ext>"
+        dirpath, stem = os.path.split(path_base)
+        listing = self.listing(dirpath)
+        if listing is None:
+            return None
+        for ext in PREVIEW_EXTENSIONS:
+            for candidate in (stem + ext, stem + '.preview' + ext):
+                name = listing.images.get(os.path.normcase(candidate))
+                if name is not None:
+                    return os.path.join(dirpath, name)
+        return None
+
+    def walk(self, top, recursive=True):
+        # (dirpath, listing) from `top` down, depth first like os.walk. Skips
+        # hidden folders and __pycache__ and doesn't follow symlinked folders.
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            listing = self.listing(dirpath)
+            if listing is None:
+                continue
+            yield dirpath, listing
+            if recursive:
+                stack.extend(os.path.join(dirpath, name) for name, is_link in reversed(listing.folders)
+                             if not is_link and not name.startswith('.') and name != "__pycache__")
+
+    def refresh(self, force=False):
+        # One stat per known directory, at most every INDEX_CHECK_INTERVAL
+        with self.lock:
+            now = time.time()
+            if not force and now - self.checked < INDEX_CHECK_INTERVAL:
+                return
+            self.checked = now
+
+            for path, listing in list(self.dirs.items()):
+                try:
+                    mtime_ns = os.stat(path).st_mtime_ns
+                except OSError:
+                    del self.dirs[path]
+                    continue
+                if mtime_ns != listing.mtime_ns or listing.listed_at - mtime_ns / 1e9 < MTIME_SETTLE_SECONDS:
+                    fresh = self.list_dir(path)
+                    if fresh is None:
+                        del self.dirs[path]
+                    else:
+                        self.dirs[path] = fresh
+
+    def forget(self, path):
+        # Relist a directory on its next visit, after we wrote into it
+        with self.lock:
+            self.dirs.pop(os.path.abspath(path), None)
+
+    def rescan(self):
+        with self.lock:
+            self.dirs.clear()
+            self.checked = time.time()
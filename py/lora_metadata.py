@@ -0,0 +1,180 @@
+import os
+import json
+import time
+import heapq
+import struct
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from .atomic_write import write_atomic
+
+# LoRA metadata is read straight from the safetensors header: an 8 byte little
+# endian length followed by that much JSON, holding the tensor table and the
+# optional "__metadata__" map. No tensors are touched and torch isn't needed.
+# Parsed results are kept in memory and under __cache__/lora_metadata, keyed
+# by path and only trusted while the file keeps its size and mtime.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+METADATA_CACHE_DIR = os.path.join(project_root, "__cache__", "lora_metadata")
+METADATA_CACHE_SIZE = 256
+MAX_HEADER_SIZE = 100 * 1024 * 1024
+HEADER_LENGTH = struct.Struct("<Q")
+
+# Summaries are small, so many more of them stay in memory than full metadata.
+# Top trigger words are picked the same way as the context menu's info panel.
+SUMMARY_CACHE_SIZE = 4096
+SUMMARY_TRIGGER_WORDS = 20
+SUMMARY_KEYS = ("ss_output_name", "ss_base_model_version", "ss_sd_model_name", "modelspec.title", "modelspec.architecture")
+
+# Prefetch reads at most this many files at once, so a full scan of a network
+# share doesn't starve the searches on the worker pool
+PREFETCH_WORKERS = 2
+PREFETCH_STATUS = {"state": "idle"}
+
+_metadata_cache = OrderedDict()
+_summary_cache = OrderedDict()
+_metadata_lock = threading.Lock()
+_prefetch_lock = threading.Lock()
+
+def read_safetensors_metadata(path):
+    with open(path, 'rb') as f:
+        prefix = f.read(HEADER_LENGTH.size)
+        if len(prefix) != HEADER_LENGTH.size:
+            raise ValueError("Not a safetensors file")
+        (length,) = HEADER_LENGTH.unpack(prefix)
+        if length > MAX_HEADER_SIZE:
+            raise ValueError("Safetensors header is too large")
+        header = f.read(length)
+
+    if len(header) != length:
+        raise ValueError("Truncated safetensors header")
+    header = json.loads(header)
+    if not isinstance(header, dict):
+        raise ValueError("Invalid safetensors header")
+
+    metadata = header.get("__metadata__") or {}
+
+    # The 'ss_tag_frequency' is often a JSON string within the metadata, so we parse it.
+    if 'ss_tag_frequency' in metadata and isinstance(metadata['ss_tag_frequency'], str):
+        try:
+            metadata['ss_tag_frequency'] = json.loads(metadata['ss_tag_frequency'])
+        except json.JSONDecodeError:
+            # Keep it as a string if it's not valid JSON
+            pass
+
+    return metadata
+
+def _cache_file(path):
+    digest = hashlib.sha1(path.encode('utf-8', 'surrogateescape')).hexdigest()
+    return os.path.join(METADATA_CACHE_DIR, digest + ".json")
+
+def _load_stored(path, key):
+    try:
+        with open(_cache_file(path), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get("path") != path or [entry.get("size"), entry.get("mtime_ns")] != list(key):
+        return None
+    return entry.get("metadata")
+
+def _store(path, key, metadata):
+    # Kept in memory as well when the cache folder isn't writable
+    entry = {"path": path, "size": key[0], "mtime_ns": key[1], "metadata": metadata}
+    write_atomic(_cache_file(path), lambda f: json.dump(entry, f), 'w', 'utf-8')
+
+def _file_key(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def _cache_get(cache, path, key):
+    with _metadata_lock:
+        entry = cache.get(path)
+        if entry is not None and entry[0] == key:
+            cache.move_to_end(path)
+            return entry[1]
+    return None
+
+def _cache_put(cache, path, key, value, size):
+    with _metadata_lock:
+        cache[path] = (key, value)
+        cache.move_to_end(path)
+        while len(cache) > size:
+            cache.popitem(last=False)
+
+def get_lora_metadata(path):
+    # Parsed header metadata of a LoRA file, shared between callers: don't modify it
+    path = os.path.abspath(path)
+    key = _file_key(path)
+
+    metadata = _cache_get(_metadata_cache, path, key)
+    if metadata is not None:
+        return metadata
+
+    metadata = _load_stored(path, key)
+    if metadata is None:
+        metadata = read_safetensors_metadata(path)
+        _store(path, key, metadata)
+
+    _cache_put(_metadata_cache, path, key, metadata, METADATA_CACHE_SIZE)
+    return metadata
+
+def summarize_metadata(metadata):
+    counts = {}
+    frequency = metadata.get('ss_tag_frequency')
+    if isinstance(frequency, dict):
+        for tags in frequency.values():
+            if isinstance(tags, dict):
+                for tag, count in tags.items():
+                    if isinstance(count, (int, float)):
+                        counts[tag] = counts.get(tag, 0) + count
+
+    summary = {key: metadata[key] for key in SUMMARY_KEYS if key in metadata}
+    summary["trigger_words"] = [tag for tag, _ in heapq.nlargest(SUMMARY_TRIGGER_WORDS, counts.items(), key=lambda item: item[1])]
+    return summary
+
+def get_lora_summary(path):
+    path = os.path.abspath(path)
+    key = _file_key(path)
+
+    summary = _cache_get(_summary_cache, path, key)
+    if summary is None:
+        summary = summarize_metadata(get_lora_metadata(path))
+        _cache_put(_summary_cache, path, key, summary, SUMMARY_CACHE_SIZE)
+    return summary
+
+def _prefetch_one(path):
+    try:
+        get_lora_summary(path)
+        return True
+    except Exception as e:
+        return False
+
+def _prefetch(list_paths):
+    try:
+        paths = list_paths()
+    except Exception as e:
+        PREFETCH_STATUS.update(state="failed", error=str(e))
+        return
+
+    PREFETCH_STATUS["total"] = len(paths)
+    with ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="erenodes-prefetch") as pool:
+        for ok in pool.map(_prefetch_one, paths):
+            PREFETCH_STATUS["done"] += 1
+            if not ok:
+                PREFETCH_STATUS["failed"] += 1
+    PREFETCH_STATUS.update(state="done", seconds=time.time() - PREFETCH_STATUS["started"])
+
+def prefetch_lora_metadata(list_paths):
+    # Fill the metadata caches for every path `list_paths()` returns, on a
+    # background thread. Returns False if a prefetch is already running.
+    with _prefetch_lock:
+        if PREFETCH_STATUS.get("state") == "running":
+            return False
+        PREFETCH_STATUS.clear()
+        PREFETCH_STATUS.update(state="running", started=time.time(), total=None, done=0, failed=0)
+
+    thread = threading.Thread(target=_prefetch, args=(list_paths,), name="erenodes-lora-prefetch", daemon=True)
+    thread.start()
+    return True
@@ -1,5 +1,31 @@
 import os
 
+DEFAULT_PREFIX_SEPARATOR = ",\n\n"
+
+# id -> node of the workflow being executed. ComfyUI passes every node of a
+# prompt the same extra_pnginfo, so the index is built once per execution
+# and shared by all Ere prompt nodes in it.
+_workflow_index = (None, {})
+
+def workflow_node(extra_pnginfo, unique_id):
+    global _workflow_index
+    try:
+        nodes = extra_pnginfo["workflow"]["nodes"]
+    except (KeyError, TypeError):
+        return None
+    if _workflow_index[0] is not nodes:
+        index = {}
+        for node in nodes:
+            index.setdefault(str(node.get("id")), node)
+        _workflow_index = (nodes, index)
+    return _workflow_index[1].get(str(unique_id))
+
+def prefix_separator(extra_pnginfo, unique_id):
+    node = workflow_node(extra_pnginfo, unique_id)
+    if node is None:
+        return DEFAULT_PREFIX_SEPARATOR
+    return (node.get("properties") or {}).get("_prefixSeparator", DEFAULT_PREFIX_SEPARATOR)
+
 class ErePrompt:
     @classmethod
     def INPUT_TYPES(cls):
@@ -19,14 +45,7 @@ class ErePrompt:
 
     def process(self, text, prefix="", extra_pnginfo="", unique_id=""):
 
-        prefix_separator = ",\n\n"
-        if extra_pnginfo and "workflow" in extra_pnginfo and "nodes" in extra_pnginfo["workflow"]:
-            for node in extra_pnginfo["workflow"]["nodes"]:
-                if str(node.get("id")) == str(unique_id):
-                    prefix_separator = node["properties"].get("_prefixSeparator", ",\n\n")
-                    break
-        
-        separator = str(prefix_separator).replace("\\n", "\n")
+        separator = str(prefix_separator(extra_pnginfo, unique_id)).replace("\\n", "\n")
         
         if prefix and text:
             return (f"{prefix}{separator}{text}",)
@@ -1,14 +1,22 @@
 import json
 import os
 import re
+import base64
 import shutil
+import hashlib
+from email.utils import formatdate
+from urllib.parse import quote
 import server 
 import yaml
 import folder_paths
 from aiohttp import web
-from safetensors import safe_open
-from .prompt_csv import TAG_TYPES, DEFAULT_ENCODING, CSV_FILES_PATH, load_tags_from_csv
-from .settings import get_erenodes_settings, save_erenodes_settings
+from .prompt_csv import CSV_FILES_PATH, csv_file_path, warm_tag_index
+from .settings import get_erenodes_settings, update_erenodes_setting
+from .workers import Superseded, run_blocking, supersede
+from .file_index import FileIndex
+from .tag_groups import MAX_EXPAND_DEPTH, TERM_KINDS, TagGroupStore
+from .thumbnails import get_thumbnail, thumbnail_etag, thumbnail_size
+from .lora_metadata import PREFETCH_STATUS, get_lora_metadata, get_lora_summary, prefetch_lora_metadata
 
 
 
@@ -32,6 +40,39 @@ def sanitize_filename(filename):
     filename = filename.replace('..', '_')
     return filename.strip()
 
+# --- Conditional GET --- #
+
+# JSON responses carry an ETag and are revalidated on every use, so browser
+# reloads and other tabs get a bodiless 304 while nothing changed
+JSON_CACHE_CONTROL = "no-cache"
+
+def file_etag(stat):
+    return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+
+def not_modified(request, etag, last_modified=None):
+    # If-None-Match wins over If-Modified-Since, as in RFC 9110
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+        # Compressed responses may come back as weak validators
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+    if last_modified is None or request.if_modified_since is None:
+        return False
+    return int(last_modified) <= request.if_modified_since.timestamp()
+
+def cached_json_response(request, data, etag=None, last_modified=None):
+    # 200 with validators, or 304 if the client's copy is current. Without a
+    # given etag the body's hash is used.
+    body = json.dumps(data)
+    if etag is None:
+        etag = '"' + hashlib.sha1(body.encode('utf-8')).hexdigest() + '"'
+    headers = {"ETag": etag, "Cache-Control": JSON_CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+    if not_modified(request, etag, last_modified):
+        return web.Response(status=304, headers=headers)
+    return web.Response(text=body, content_type="application/json", headers=headers)
+
 # --- API Endpoints ---
 
 @server.PromptServer.instance.routes.post("/erenodes/set_setting")
@@ -42,22 +83,15 @@ async def set_setting_handler(request):
 
     if key is None:
         return web.json_response({"status": "error", "message": "Setting 'key' not provided"}, status=400)
+    if key == "autocomplete.csv" and value and csv_file_path(value) is None:
+        return web.json_response({"status": "error", "message": f"Unknown CSV file: {value}"}, status=400)
 
-    settings = get_erenodes_settings()
-    
     # Simple key update, can be expanded for nested keys if needed
-    settings[key] = value
-    
-    save_erenodes_settings(settings)
+    update_erenodes_setting(key, value)
 
-    # If the active CSV is changed, we need to reload the tags
-    if key == "autocomplete.csv_file":
-        try:
-            load_tags_from_csv(value, encoding=DEFAULT_ENCODING, csv_files_path=CSV_FILES_PATH)
-        except Exception as e:
-            # It's okay if this fails (e.g., file not found during a temporary state)
-            # The setting is still saved.
-            pass
+    # If the active CSV is changed, start loading it before the first search needs it
+    if key == "autocomplete.csv" and value:
+        warm_tag_index(value)
 
     return web.json_response({"status": "ok"})
 
@@ -70,7 +104,7 @@ async def list_csv_files_handler(request):
         return web.json_response([])
     
     files = [f for f in os.listdir(CSV_FILES_PATH) if f.endswith(".csv")]
-    return web.json_response(files)
+    return cached_json_response(request, files)
 
 @server.PromptServer.instance.routes.get("/erenodes/list_tag_groups")
 async def list_tag_groups_handler(request):
@@ -104,18 +138,13 @@ async def list_tag_groups_handler(request):
                 items.append({"name": entry, "type": "file"})
 
         items.sort(key=lambda x: (x["type"] == "file", x["name"].lower()))
-        return web.json_response(items)
+        return cached_json_response(request, items)
     except Exception as e:
         return web.json_response({"error": f"Error listing files: {str(e)}"}, status=500)
 
-@server.PromptServer.instance.routes.get("/erenodes/get_tag_group")
-async def get_tag_group_handler(request):
-    filename_param = request.query.get("filename")
-
-    if not filename_param:
-        return web.json_response({"message": "Filename not provided"}, status=400)
-
-    safe_filename = filename_param.lstrip('/').lstrip('\\')
+def tag_group_path(filename):
+    # Absolute path of a group file name relative to __prompts__, None if it points outside
+    safe_filename = filename.lstrip('/').lstrip('\\')
     safe_filename = safe_filename.replace("..", "_")
 
     if os.path.isabs(safe_filename):
@@ -124,20 +153,110 @@ async def get_tag_group_handler(request):
     file_path = os.path.abspath(os.path.join(prompts_dir, safe_filename))
 
     if not file_path.startswith(os.path.abspath(prompts_dir)):
+        return None
+    return file_path
+
+@server.PromptServer.instance.routes.get("/erenodes/get_tag_group")
+async def get_tag_group_handler(request):
+    filename_param = request.query.get("filename")
+
+    if not filename_param:
+        return web.json_response({"message": "Filename not provided"}, status=400)
+
+    file_path = tag_group_path(filename_param)
+    if file_path is None:
         return web.json_response({"error": "Forbidden path"}, status=403)
 
     if not os.path.exists(file_path) or not os.path.isfile(file_path):
         return web.json_response({"error": "Tag group not found"}, status=404)
 
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        return web.json_response(data)
+        # Validated by the file's mtime and size, a 304 doesn't read the file
+        stat = os.stat(file_path)
+        etag = file_etag(stat)
+        if not_modified(request, etag, stat.st_mtime):
+            return web.Response(status=304, headers={"ETag": etag, "Cache-Control": JSON_CACHE_CONTROL})
+        data = TAG_GROUPS.get(file_path)
+        return cached_json_response(request, data, etag, stat.st_mtime)
     except json.JSONDecodeError:
         return web.json_response({"error": "Invalid JSON format in tag group file"}, status=500)
     except Exception as e:
         return web.json_response({"error": f"Error reading file: {str(e)}"}, status=500)
 
+MAX_BULK_GROUPS = 500
+
+@server.PromptServer.instance.routes.post("/erenodes/get_tag_groups_bulk")
+async def get_tag_groups_bulk_handler(request):
+    # {"paths": [group file names], "expand": true, "max_depth": 8} returns every
+    # group once, keyed by the name it was requested or referenced by. With
+    # expand, groups referenced from groups are included too.
+    try:
+        data = await request.json()
+    except ValueError:
+        return web.json_response({"error": "Invalid JSON body"}, status=400)
+
+    paths = data.get("paths") if isinstance(data, dict) else None
+    if not isinstance(paths, list) or not all(isinstance(path, str) and path for path in paths):
+        return web.json_response({"error": "'paths' must be a list of file names"}, status=400)
+    if len(paths) > MAX_BULK_GROUPS:
+        return web.json_response({"error": f"At most {MAX_BULK_GROUPS} groups per request"}, status=400)
+
+    max_depth = 0
+    if data.get("expand"):
+        try:
+            max_depth = max(0, min(int(data.get("max_depth", MAX_EXPAND_DEPTH)), MAX_EXPAND_DEPTH))
+        except (TypeError, ValueError):
+            return web.json_response({"error": "Invalid max_depth"}, status=400)
+
+    result = await run_blocking(TAG_GROUPS.expand, paths, tag_group_path, max_depth)
+    return web.json_response(result)
+
+MAX_GROUP_RESULTS = 1000
+
+def search_tag_groups(queries, kinds, contains, limit):
+    # Groups containing every query, runs on the worker pool
+    found = None
+    for query in queries:
+        matches = TAG_GROUPS.search(query, kinds, contains)
+        if found is None:
+            found = matches
+        else:
+            found = {rel: terms + matches[rel] for rel, terms in found.items() if rel in matches}
+
+    items = []
+    for rel in sorted(found, key=lambda rel: (rel.lower(), rel)):
+        path, extension = os.path.splitext(rel)
+        items.append({
+            "name": os.path.basename(path),
+            "type": "group",
+            "path": path,
+            "extension": extension,
+            "matches": [{"kind": kind, "value": value} for kind, value in sorted(set(found[rel]))],
+        })
+    return {"items": items[:limit], "total": len(items)}
+
+@server.PromptServer.instance.routes.get("/erenodes/search_tag_groups")
+async def search_tag_groups_handler(request):
+    # ?q=<tag, LoRA, trigger word...> (repeat to require several), optionally
+    # &kind=lora,tag to narrow what q is compared to and &match=contains for
+    # substrings instead of whole names
+    queries = [query for query in request.query.getall("q", []) if query.strip()]
+    if not queries:
+        return web.json_response({"error": "No query provided"}, status=400)
+
+    kinds = tuple(kind for kind in request.query.get("kind", "").split(",") if kind) or TERM_KINDS
+    unknown = [kind for kind in kinds if kind not in TERM_KINDS]
+    if unknown:
+        return web.json_response({"error": f"Unknown kind: {', '.join(unknown)}"}, status=400)
+    contains = request.query.get("match") == "contains"
+    try:
+        limit = max(1, min(int(request.query.get("limit", MAX_GROUP_RESULTS)), MAX_GROUP_RESULTS))
+    except ValueError:
+        return web.json_response({"error": "Invalid limit"}, status=400)
+
+    data = await run_blocking(search_tag_groups, queries, kinds, contains, limit)
+    return cached_json_response(request, data)
+
 @server.PromptServer.instance.routes.post("/erenodes/save_tag_group")
 async def save_tag_group_handler(request):
     try:
@@ -170,6 +289,9 @@ async def save_tag_group_handler(request):
         tags_data = json.loads(tags_json_str)
         with open(file_path, 'w', encoding='utf-8') as f:
             json.dump(tags_data, f, indent=2)
+        # The group and its preview image both land in target_dir
+        FILE_INDEXES['group'].forget(target_dir)
+        TAG_GROUPS.update(file_path)
 
         message = f"Tag group '{os.path.join(safe_path_param, safe_filename) if safe_path_param else safe_filename}' saved successfully."
 
@@ -214,7 +336,39 @@ async def save_tag_group_handler(request):
 
 # --- LORA API Endpoints --- #
 
+# Resolved roots per model type, with the inputs they were resolved from
+MODEL_PATHS_CACHE = {}
+
+def extra_model_paths_yaml():
+    return os.path.join(os.path.dirname(folder_paths.__file__), 'extra_model_paths.yaml')
+
 def get_robust_model_paths(model_type):
+    # Memoized resolve_model_paths. An entry is reused while ComfyUI reports
+    # the same folders and extra_model_paths.yaml keeps its mtime, so most
+    # requests cost one stat instead of a YAML parse and an exists() per path.
+    try:
+        default_paths = tuple(folder_paths.get_folder_paths(model_type) or ())
+    except Exception as e:
+        default_paths = ()
+    try:
+        yaml_mtime = os.stat(extra_model_paths_yaml()).st_mtime_ns
+    except Exception as e:
+        yaml_mtime = None
+
+    key = (default_paths, yaml_mtime)
+    cached = MODEL_PATHS_CACHE.get(model_type)
+    if cached is None or cached[0] != key:
+        # The view route takes the type from the URL, don't let that grow forever
+        if len(MODEL_PATHS_CACHE) >= 64:
+            MODEL_PATHS_CACHE.clear()
+        cached = MODEL_PATHS_CACHE[model_type] = (key, resolve_model_paths(model_type))
+    return list(cached[1])
+
+def refresh_model_paths():
+    # For roots that appeared or went away without a YAML change, e.g. a remounted drive
+    MODEL_PATHS_CACHE.clear()
+
+def resolve_model_paths(model_type):
     # Get model paths from multiple sources to handle different ComfyUI installations.
     # 1. ComfyUI's folder_paths (default)
     # 2. extra_model_paths.yaml (used by Stability Matrix and other managers)
@@ -233,11 +387,8 @@ def get_robust_model_paths(model_type):
     try:
         # Look for extra_model_paths.yaml in multiple possible locations
         import os
-        # Use the directory where folder_paths module is located (ComfyUI root)
-        comfyui_root = os.path.dirname(folder_paths.__file__)
-        
         # Single universal path that works for all installations
-        yaml_path = os.path.join(comfyui_root, 'extra_model_paths.yaml')
+        yaml_path = extra_model_paths_yaml()
 
         
         extra_paths_file = None
@@ -308,6 +459,63 @@ def get_robust_model_paths(model_type):
 
     return unique_paths
 
+def find_lora_file(filename):
+    lora_path = folder_paths.get_full_path("loras", filename)
+    if not lora_path:
+        # Try to find it in the old loras folder as well
+        lora_path = folder_paths.get_full_path("loras_old", filename)
+    return lora_path
+
+def read_lora_metadata(filename):
+    lora_path = find_lora_file(filename)
+    if not lora_path:
+        return None
+
+    # Header-only read, cached in memory and on disk, see lora_metadata.py
+    return get_lora_metadata(lora_path)
+
+def list_lora_files(folder="", recursive=False):
+    # {filename relative to its LoRA root: absolute path} for the .safetensors
+    # files in `folder`, first root wins like folder_paths.get_full_path
+    index = FILE_INDEXES['lora']
+    index.refresh()
+    folder = os.path.normpath(folder.strip('/\\')) if folder else ""
+
+    found = {}
+    for root in get_robust_model_paths("loras"):
+        abs_root = os.path.abspath(root)
+        top = os.path.abspath(os.path.join(abs_root, folder))
+        if os.path.commonpath([abs_root, top]) != abs_root:
+            continue
+        for dirpath, listing in index.walk(top, recursive):
+            relative_dir = os.path.relpath(dirpath, abs_root)
+            for name, ext, _ in listing.files:
+                if ext.lower() != '.safetensors':
+                    continue
+                filename = name + ext if relative_dir == '.' else os.path.join(relative_dir, name + ext)
+                found.setdefault(filename, os.path.join(dirpath, name + ext))
+    return found
+
+def read_lora_metadata_bulk(files, folder, recursive, summary):
+    # {filename: metadata or summary} plus {filename: error} for the ones that failed
+    if files is not None:
+        paths = {filename: find_lora_file(filename) for filename in files[:MAX_BULK_LORAS]}
+    else:
+        paths = dict(list(list_lora_files(folder, recursive).items())[:MAX_BULK_LORAS])
+
+    results = {}
+    errors = {}
+    read = get_lora_summary if summary else get_lora_metadata
+    for filename, lora_path in paths.items():
+        if not lora_path:
+            errors[filename] = "Lora not found in any known folder"
+            continue
+        try:
+            results[filename] = read(lora_path)
+        except Exception as e:
+            errors[filename] = str(e)
+    return results, errors
+
 @server.PromptServer.instance.routes.get("/erenodes/get_lora_metadata")
 async def get_lora_metadata_handler(request):
     filename = request.query.get("filename")
@@ -315,67 +523,98 @@ async def get_lora_metadata_handler(request):
         return web.json_response({"error": "Filename not provided"}, status=400)
 
     try:
-        lora_path = folder_paths.get_full_path("loras", filename)
-        if not lora_path:
-            # Try to find it in the old loras folder as well
-            lora_path = folder_paths.get_full_path("loras_old", filename)
-            if not lora_path:
-                return web.json_response({"error": "Lora not found in any known folder"}, status=404)
-
-        metadata = {}
-        with safe_open(lora_path, framework="pt", device="cpu") as f:
-            metadata = f.metadata()
-        
-        if not metadata:
-            return web.json_response({})
-
-        # The 'ss_tag_frequency' is often a JSON string within the metadata, so we parse it.
-        if 'ss_tag_frequency' in metadata and isinstance(metadata['ss_tag_frequency'], str):
-            try:
-                metadata['ss_tag_frequency'] = json.loads(metadata['ss_tag_frequency'])
-            except json.JSONDecodeError:
-                # Keep it as a string if it's not valid JSON
-                pass
-
+        metadata = await run_blocking(read_lora_metadata, filename)
+        if metadata is None:
+            return web.json_response({"error": "Lora not found in any known folder"}, status=404)
         return web.json_response(metadata)
     except Exception as e:
         # Consider logging the full error for debugging
         return web.json_response({"error": "Failed to read LoRA metadata: " + str(e)}, status=500)
 
+MAX_BULK_LORAS = 2000
+
+@server.PromptServer.instance.routes.post("/erenodes/get_lora_metadata_bulk")
+async def get_lora_metadata_bulk_handler(request):
+    # Body: {"files": [...]} or {"folder": "sub/dir", "recursive": false},
+    # plus "summary": true for trigger words and a few fields instead of everything
+    try:
+        data = await request.json()
+    except Exception:
+        return web.json_response({"error": "Invalid JSON body"}, status=400)
+    if not isinstance(data, dict):
+        return web.json_response({"error": "Expected a JSON object"}, status=400)
+
+    files = data.get("files")
+    if files is not None and not isinstance(files, list):
+        return web.json_response({"error": "'files' must be a list"}, status=400)
+    if files is None and not isinstance(data.get("folder", ""), str):
+        return web.json_response({"error": "'folder' must be a string"}, status=400)
+
+    results, errors = await run_blocking(
+        read_lora_metadata_bulk,
+        [str(f) for f in files] if files is not None else None,
+        data.get("folder", ""),
+        bool(data.get("recursive", False)),
+        bool(data.get("summary", True)),
+    )
+    return web.json_response({"results": results, "errors": errors})
+
+@server.PromptServer.instance.routes.post("/erenodes/prefetch_lora_metadata")
+async def prefetch_lora_metadata_handler(request):
+    # Reads and caches every LoRA's metadata in the background, poll the GET for progress
+    started = prefetch_lora_metadata(lambda: list(list_lora_files(recursive=True).values()))
+    return web.json_response(dict(PREFETCH_STATUS, started_now=started))
+
+@server.PromptServer.instance.routes.get("/erenodes/prefetch_lora_metadata")
+async def prefetch_lora_metadata_status_handler(request):
+    return web.json_response(dict(PREFETCH_STATUS))
+
 # --- Unified File Search API Endpoint --- #
 
-@server.PromptServer.instance.routes.get("/erenodes/search_files")
-async def search_files_handler(request):
-    raw_query = request.query.get("query", "")
-    path_param = request.query.get("path", "")
-    file_type = request.query.get("type")
-    
+FILE_EXTENSIONS = {
+    'lora': ('.safetensors', '.pt', '.ckpt', '.lora'),
+    'embedding': ('.pt', '.bin', '.safetensors', '.embedding'),
+    'group': ('.json',),
+}
+FILE_INDEXES = {file_type: FileIndex(extensions) for file_type, extensions in FILE_EXTENSIONS.items()}
+# Group contents and what they contain, see tag_groups.py
+TAG_GROUPS = TagGroupStore(prompts_dir, FILE_INDEXES['group'])
+MAX_PAGE_SIZE = 1000
 
+def listing_sort_key(item):
+    # Folders first, then by name, the path keeps equal names in a stable order
+    return (item["type"] != "folder", item["name"].lower(), item["path"])
 
-    if not file_type:
-        return web.json_response({"error": "File type not provided"}, status=400)
+def encode_cursor(item):
+    return base64.urlsafe_b64encode(json.dumps(listing_sort_key(item)).encode('utf-8')).decode('ascii')
 
-    type_configs = {
-        'lora': {
-            'roots': get_robust_model_paths("loras"),
-            'extensions': ('.safetensors', '.pt', '.ckpt', '.lora'),
-        },
-        'embedding': {
-            'roots': get_robust_model_paths("embeddings"),
-            'extensions': ('.pt', '.bin', '.safetensors', '.embedding'),
-        },
-        'group': {
-            'roots': [prompts_dir],
-            'extensions': ('.json',),
-        }
+def decode_cursor(cursor):
+    try:
+        is_file, name, path = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, TypeError, UnicodeError):
+        raise ValueError("Invalid cursor")
+    return (bool(is_file), str(name), str(path))
+
+def search_files(file_type, raw_query, path_param, cancelled=lambda: False, details=None, limit=None, cursor=None, names=None):
+    # Returns (response body, status), runs on the worker pool
+    type_roots = {
+        'lora': lambda: get_robust_model_paths("loras"),
+        'embedding': lambda: get_robust_model_paths("embeddings"),
+        'group': lambda: [prompts_dir],
     }
 
-    config = type_configs.get(file_type)
-    if not config:
-        return web.json_response({"error": f"Invalid file type: {file_type}"}, status=400)
-    
-    collection_paths = config['roots']
-    extensions = config['extensions']
+    if file_type not in type_roots:
+        return {"error": f"Invalid file type: {file_type}"}, 400
+
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return {"error": str(e)}, 400
+
+    collection_paths = type_roots[file_type]()
+    # Listings come from the in-memory index, see file_index.py
+    index = FILE_INDEXES[file_type]
+    index.refresh()
 
     potential_nav_folder = ""
     actual_search_query = raw_query.lower()
@@ -392,10 +631,12 @@ async def search_files_handler(request):
 
     try:
         if not collection_paths:
-            return web.json_response({"items": [], "parentPath": path_param if path_param else ""})
+            return {"items": [], "parentPath": path_param if path_param else ""}, 200
 
         items = []
         found_relative_paths = set()
+        # prompt path -> (directory, file name), for details on the returned page
+        file_locations = {}
 
         scan_target_abs = None
         current_collection_root_abs = None
@@ -405,15 +646,15 @@ async def search_files_handler(request):
             for root in collection_paths:
                 abs_root = os.path.abspath(root)
                 potential_scan_path = os.path.abspath(os.path.join(abs_root, normalized_path_param))
-                if os.path.isdir(potential_scan_path) and os.path.commonpath([abs_root, potential_scan_path]) == abs_root:
+                if os.path.commonpath([abs_root, potential_scan_path]) == abs_root and index.listing(potential_scan_path) is not None:
                     scan_target_abs = potential_scan_path
                     current_collection_root_abs = abs_root
                     break
             if not scan_target_abs:
-                return web.json_response({"items": [], "parentPath": path_param})
+                return {"items": [], "parentPath": path_param}, 200
         else:
             if not collection_paths:
-                return web.json_response({"items": [], "parentPath": ""})
+                return {"items": [], "parentPath": ""}, 200
                 
 
             
@@ -428,59 +669,83 @@ async def search_files_handler(request):
                 current_scan_target = os.path.abspath(root_path)
                 current_collection_root_abs = current_scan_target
                 
-            if not os.path.exists(current_scan_target):
-                continue
-                
-            for dirpath, dirnames_orig, filenames in os.walk(current_scan_target, topdown=True):
-                 is_current_scan_level = (os.path.normpath(dirpath) == os.path.normpath(current_scan_target))
-
-                 # Process files
-                 for filename in filenames:
-                     if filename.lower().endswith(extensions):
-                         filename_no_ext, file_ext = os.path.splitext(filename)
-                         full_file_path_abs = os.path.join(dirpath, filename)
-                         relative_to_collection_root = os.path.relpath(full_file_path_abs, current_collection_root_abs)
-                         prompt_path = os.path.splitext(relative_to_collection_root)[0]
-
-                         item_data = {"name": filename_no_ext, "type": file_type, "path": prompt_path, "extension": file_ext}
-
-                         if query:
-                             if query in filename_no_ext.lower() or query in prompt_path.lower():
-                                 if prompt_path not in found_relative_paths:
-                                     items.append(item_data)
-                                     found_relative_paths.add(prompt_path)
-                         else:
-                             if is_current_scan_level:
-                                 if prompt_path not in found_relative_paths:
-                                     items.append(item_data)
-                                     found_relative_paths.add(prompt_path)
-                 
-                 # Process folders
-                 current_level_dirnames_to_process = list(dirnames_orig)
-                 dirnames_orig[:] = []
-
-                 for dirname in current_level_dirnames_to_process:
-                     if dirname.startswith('.') or dirname == "__pycache__":
-                         continue
-
-                     full_folder_path_abs = os.path.join(dirpath, dirname)
-                     relative_to_collection_root = os.path.relpath(full_folder_path_abs, current_collection_root_abs)
-
-
-                     if query:
-                         if query in dirname.lower():
-                             if relative_to_collection_root not in found_relative_paths:
-                                 items.append({"name": dirname, "type": "folder", "path": relative_to_collection_root})
-                                 found_relative_paths.add(relative_to_collection_root)
-                         dirnames_orig.append(dirname)
-                     else:
-                         if is_current_scan_level:
-                            if relative_to_collection_root not in found_relative_paths:
-                                items.append({"name": dirname, "type": "folder", "path": relative_to_collection_root})
-                                found_relative_paths.add(relative_to_collection_root)
-
-        items.sort(key=lambda x: (x["type"] != "folder", x["name"].lower()))
-        
+            # Same traversal as os.walk(current_scan_target): depth first, into
+            # non-hidden folders only when searching, never through symlinks
+            stack = [current_scan_target]
+            while stack:
+                if cancelled():
+                    raise Superseded()
+                dirpath = stack.pop()
+                listing = index.listing(dirpath)
+                if listing is None:
+                    continue
+                is_current_scan_level = dirpath == current_scan_target
+                relative_dir = os.path.relpath(dirpath, current_collection_root_abs)
+                relative_dir_lower = relative_dir.lower()
+
+                # Process files
+                for filename_no_ext, file_ext, name_lower in listing.files:
+                    if relative_dir == '.':
+                        prompt_path, path_lower = filename_no_ext, name_lower
+                    else:
+                        prompt_path = os.path.join(relative_dir, filename_no_ext)
+                        path_lower = os.path.join(relative_dir_lower, name_lower)
+
+                    if query:
+                        if query not in path_lower:
+                            continue
+                    elif not is_current_scan_level:
+                        continue
+                    if names is not None and filename_no_ext not in names:
+                        continue
+                    if prompt_path not in found_relative_paths:
+                        items.append({"name": filename_no_ext, "type": file_type, "path": prompt_path, "extension": file_ext})
+                        found_relative_paths.add(prompt_path)
+                        file_locations[prompt_path] = (dirpath, filename_no_ext + file_ext)
+
+                # Process folders
+                subdirs = []
+                for dirname, is_link in listing.folders:
+                    if dirname.startswith('.') or dirname == "__pycache__":
+                        continue
+                    if names is not None:
+                        continue
+                    if not query and not is_current_scan_level:
+                        continue
+
+                    relative_to_collection_root = dirname if relative_dir == '.' else os.path.join(relative_dir, dirname)
+                    if (not query or query in dirname.lower()) and relative_to_collection_root not in found_relative_paths:
+                        items.append({"name": dirname, "type": "folder", "path": relative_to_collection_root})
+                        found_relative_paths.add(relative_to_collection_root)
+                    if query and not is_link:
+                        subdirs.append(os.path.join(dirpath, dirname))
+                stack.extend(reversed(subdirs))
+
+        items.sort(key=listing_sort_key)
+
+        # Pages continue after the sort key of the previous page's last item
+        next_cursor = None
+        if after is not None:
+            items = [item for item in items if listing_sort_key(item) > after]
+        if limit and len(items) > limit:
+            items = items[:limit]
+            next_cursor = encode_cursor(items[-1])
+
+        # Preview availability comes from the cached listings, sizes and
+        # mtimes are stat'ed for this page only and only when asked for
+        if details:
+            for item in items:
+                location = file_locations.get(item["path"])
+                if location is None:
+                    continue
+                has_preview = find_preview_image(file_type, collection_paths, item["path"]) is not None
+                item["preview"] = has_preview
+                item["previewUrl"] = f"/erenodes/view/{file_type}/{quote(item['path'].replace(os.sep, '/'))}" if has_preview else None
+                if details != "all":
+                    continue
+                stat = index.file_stat(*location)
+                item["size"], item["mtime"] = stat if stat else (None, None)
+
         # Handle path information for response
         if path_param:
             current_relative_path_for_client = os.path.relpath(scan_target_abs, current_collection_root_abs)
@@ -501,11 +766,70 @@ async def search_files_handler(request):
             "currentPath": current_relative_path_for_client,
             "parentPath": parent_path_for_client
         }
+        if limit:
+            response_data["nextCursor"] = next_cursor
         
-        return web.json_response(response_data)
+        return response_data, 200
 
+    except Superseded:
+        raise
     except Exception as e:
-        return web.json_response({"items": [], "parentPath": path_param if path_param else "", "error": str(e)}, status=500)
+        return {"items": [], "parentPath": path_param if path_param else "", "error": str(e)}, 500
+
+
+@server.PromptServer.instance.routes.get("/erenodes/search_files")
+async def search_files_handler(request):
+    raw_query = request.query.get("query", "")
+    path_param = request.query.get("path", "")
+    file_type = request.query.get("type")
+
+    if not file_type:
+        return web.json_response({"error": "File type not provided"}, status=400)
+
+    # ?details=1 adds preview, previewUrl, size and mtime to file items and
+    # ?details=preview only the first two. ?limit=<n> pages the items and
+    # &cursor=<nextCursor> fetches the next page. Repeated &name=<file name
+    # without extension> returns just those files, e.g. the gallery's pills.
+    details = request.query.get("details", "")
+    details = None if details in ("", "0", "false") else "preview" if details == "preview" else "all"
+    names = set(request.query.getall("name", [])) or None
+    cursor = request.query.get("cursor") or None
+    try:
+        limit = int(request.query["limit"]) if request.query.get("limit") else None
+    except ValueError:
+        return web.json_response({"error": "Invalid limit"}, status=400)
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    # Drop scans for keystrokes the client has already typed past
+    cancelled = supersede(request.query.get("channel"))
+    try:
+        data, status = await run_blocking(search_files, file_type, raw_query, path_param, cancelled, details, limit, cursor, names, cancelled=cancelled)
+    except Superseded:
+        return web.json_response({"items": [], "parentPath": path_param})
+    if status != 200:
+        return web.json_response(data, status=status)
+    return cached_json_response(request, data)
+
+@server.PromptServer.instance.routes.post("/erenodes/rescan_files")
+async def rescan_files_handler(request):
+    # Drop the cached listings of one type (?type=lora) or of all of them
+    file_type = request.query.get("type")
+    if file_type and file_type not in FILE_INDEXES:
+        return web.json_response({"error": f"Invalid file type: {file_type}"}, status=400)
+
+    file_types = [file_type] if file_type else list(FILE_INDEXES)
+    refresh_model_paths()
+    for name in file_types:
+        FILE_INDEXES[name].rescan()
+    if 'group' in file_types:
+        TAG_GROUPS.rescan()
+    return web.json_response({"rescanned": file_types})
+
+@server.PromptServer.instance.routes.post("/erenodes/refresh_model_paths")
+async def refresh_model_paths_handler(request):
+    refresh_model_paths()
+    return web.json_response({"loras": get_robust_model_paths("loras"), "embeddings": get_robust_model_paths("embeddings")})
 
 
 @server.PromptServer.instance.routes.post("/erenodes/create_folder")
@@ -531,19 +855,37 @@ async def create_folder_handler(request):
             return web.json_response({"message": "A folder or file with this name already exists."}, status=409)
 
         os.makedirs(new_folder_path)
+        FILE_INDEXES['group'].forget(target_dir)
         return web.json_response({"message": "Folder created successfully."})
     except Exception as e:
         return web.json_response({"error": str(e)}, status=500)
 
-@server.PromptServer.instance.routes.get("/erenodes/view/{type}/{path:.*}")
-async def view_file_handler(request):
-    type_name = request.match_info.get("type")
-    path_param = request.match_info.get("path")
+# Directory listings for /erenodes/view types that have no search index of their own
+PREVIEW_INDEX = FileIndex(())
 
-    if not type_name or not path_param:
-        return web.Response(status=400, text="Missing type or path")
+def find_preview_image(type_name, base_dirs, path_param):
+    # Looked up in the cached directory listings, so hits and misses alike
+    # cost no disk access until a directory changes
+    index = FILE_INDEXES.get(type_name, PREVIEW_INDEX)
+    index.refresh()
 
-    # Determine base directories
+    for root_dir in base_dirs:
+        abs_root_dir = os.path.abspath(root_dir)
+        # The path_param is the path to the main file, *without* its extension.
+        # It's what we use as the base for finding a preview image.
+        prospective_path_base = os.path.abspath(os.path.join(abs_root_dir, path_param))
+
+        # Security check: ensure the requested path is within the intended directory
+        if prospective_path_base.startswith(abs_root_dir):
+            # Check for both filename.extension and filename.preview.extension patterns
+            image_path = index.find_preview(prospective_path_base)
+            if image_path:
+                return image_path
+
+    return None
+
+def locate_preview_image(type_name, path_param):
+    # (base directories, preview image path or None)
     if type_name == 'group':
         # The 'prompts_dir' is already an absolute path.
         base_dirs = [prompts_dir]
@@ -552,36 +894,66 @@ async def view_file_handler(request):
         base_dirs = get_robust_model_paths(type_name + 's')
 
     if not base_dirs:
-        return web.Response(status=404, text=f"No folder configured for type '{type_name}'")
+        return base_dirs, None
+    return base_dirs, find_preview_image(type_name, base_dirs, path_param)
+
+# Thumbnails are keyed by the source's mtime and size through the ETag, the
+# frontend re-fetches with cache: 'reload' after replacing a preview image
+THUMBNAIL_CACHE_CONTROL = "public, max-age=604800"
+
+@server.PromptServer.instance.routes.get("/erenodes/view/{type}/{path:.*}")
+async def view_file_handler(request):
+    type_name = request.match_info.get("type")
+    path_param = request.match_info.get("path")
+
+    if not type_name or not path_param:
+        return web.Response(status=400, text="Missing type or path")
 
     # This is a basic sanitization. The check below is more robust.
     # It prevents using '..' to escape the intended directories.
     path_param = path_param.replace("..", "_")
 
-    potential_extensions = ['.jpg', '.jpeg', '.png', '.webp']
+    # Resolving roots and refreshing the listings stats directories, which
+    # can stall on network mounts, so it runs on the worker pool
+    base_dirs, image_path = await run_blocking(locate_preview_image, type_name, path_param)
+    if not base_dirs:
+        return web.Response(status=404, text=f"No folder configured for type '{type_name}'")
+    if not image_path:
+        # If we get here, no file was found in any of the directories
+        return web.Response(status=404, text="Preview image not found")
+
+    # ?thumb=<px> serves a downscaled copy, see thumbnails.py
+    thumb = request.query.get("thumb")
+    if not thumb:
+        return web.FileResponse(image_path)
+    try:
+        size = thumbnail_size(int(thumb))
+    except ValueError:
+        return web.Response(status=400, text="Invalid thumbnail size")
 
-    for root_dir in base_dirs:
-        abs_root_dir = os.path.abspath(root_dir)
-        # The path_param is the path to the main file, *without* its extension.
-        # It's what we use as the base for finding a preview image.
-        prospective_path_base = os.path.join(abs_root_dir, path_param)
+    try:
+        source_stat = await run_blocking(os.stat, image_path)
+    except OSError:
+        return web.Response(status=404, text="Preview image not found")
+
+    headers = {
+        "ETag": thumbnail_etag(source_stat, size),
+        "Last-Modified": formatdate(source_stat.st_mtime, usegmt=True),
+        "Cache-Control": THUMBNAIL_CACHE_CONTROL,
+    }
+    if not_modified(request, headers["ETag"], source_stat.st_mtime):
+        return web.Response(status=304, headers=headers)
 
-        # Security check: ensure the requested path is within the intended directory
-        if os.path.abspath(prospective_path_base).startswith(abs_root_dir):
-            # Check for both filename.extension and filename.preview.extension patterns
-            for ext in potential_extensions:
-                # First try: filename.extension (original pattern)
-                image_path = prospective_path_base + ext
-                if os.path.isfile(image_path):
-                    return web.FileResponse(image_path)
-                
-                # Second try: filename.preview.extension (new pattern)
-                preview_image_path = prospective_path_base + '.preview' + ext
-                if os.path.isfile(preview_image_path):
-                    return web.FileResponse(preview_image_path)
-    
-    # If we get here, no file was found in any of the directories
-    return web.Response(status=404, text="Preview image not found")
+    try:
+        thumbnail = await run_blocking(get_thumbnail, image_path, size, source_stat)
+    except Exception as e:
+        thumbnail = None
+    if thumbnail is None:
+        # No Pillow, or not an image it can read: fall back to the original file
+        return web.FileResponse(image_path)
+
+    data, content_type = thumbnail
+    return web.Response(body=data, content_type=content_type, headers=headers)
 
 @server.PromptServer.instance.routes.post("/erenodes/save_file_image")
 async def save_file_image_handler(request):
@@ -653,6 +1025,7 @@ async def save_file_image_handler(request):
             image_file_field.file.seek(0)
             import shutil
             shutil.copyfileobj(image_file_field.file, f_img)
+        FILE_INDEXES[file_type].forget(file_dir)
 
         message = f"Image '{image_filename}' saved successfully for {file_type} '{file_name}'."
         return web.json_response({"message": message})
@@ -0,0 +1,209 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+
+from .prompt_api import TAG_GROUPS, tag_group_path
+from .prompt_lora_stack import prompt_to_lora_stack
+from .tag_groups import MAX_EXPAND_DEPTH
+
+# Builds the final prompt on the backend, the way the prompt nodes' frontend
+# does: "group:<file>" references are replaced by the active tags of that group
+# from __prompts__, LoRA triggers are added after their LoRA, and weights are
+# written the same way every time. Queue submissions made through the API,
+# without the frontend, get the same text and LoRA stack as the editor shows.
+
+# Commas inside parentheses belong to a weighted token, as in parseTextToTagData
+TOKEN_SPLIT = re.compile(r',(?![^()]*\))')
+GROUP_TOKEN = re.compile(r'^group:(.+)$')
+WEIGHTED_GROUP_TOKEN = re.compile(r'^\(group:([^():]+):([\d.-]+)\)$')
+LORA_TOKEN = re.compile(r'^<lora:([^:]+)(?::([\d.-]+))?>$')
+WEIGHTED_TOKEN = re.compile(r'^\((.*):([\d.-]+)\)$')
+
+# Compiled prompts by text, each valid while the groups it read keep their mtime and size
+COMPILE_CACHE_SIZE = 256
+_compile_cache = OrderedDict()
+_compile_lock = threading.Lock()
+# Prompt text each Prompt Compiler node compiled last, by node id
+_node_prompts = {}
+
+def js_number(value):
+    # Number formatting of the frontend's template strings: 2 -> "2", 0.8 -> "0.8"
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def _strength(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def format_lora(name, strength):
+    strength = 1.0 if strength is None else strength
+    return f"<lora:{name}:{strength:.1f}>" if strength.is_integer() else f"<lora:{name}:{js_number(strength)}>"
+
+def format_tag(name, strength):
+    if strength is not None and strength != 1.0:
+        return f"({name}:{js_number(strength)})"
+    return name
+
+def group_key(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class PromptCompiler:
+    def __init__(self):
+        # (path, (mtime_ns, size) or None) of every group read
+        self.dependencies = {}
+
+    def load_group(self, filename):
+        path = tag_group_path(filename)
+        if path is None:
+            return None
+        self.dependencies[path] = group_key(path)
+        try:
+            tags = TAG_GROUPS.get(path)
+        except (OSError, ValueError):
+            return None
+        return tags if isinstance(tags, list) else None
+
+    def expand_group(self, filename, strength, chain):
+        # Active tags of a group joined like onUpdateTextWidget does, or None
+        # for missing groups and reference loops
+        if filename in chain or len(chain) > MAX_EXPAND_DEPTH:
+            return None
+        tags = self.load_group(filename)
+        if tags is None:
+            return None
+
+        chain = chain + [filename]
+        parts = []
+        for tag in tags:
+            if not isinstance(tag, dict) or not tag.get("active") or not isinstance(tag.get("name"), str) or not tag["name"]:
+                continue
+            part = self.format_tag_object(tag, chain)
+            if part:
+                parts.append(part)
+            if tag.get("type") == "lora" and isinstance(tag.get("triggers"), list):
+                parts.extend(trigger for trigger in tag["triggers"] if isinstance(trigger, str) and trigger)
+        if not parts:
+            return None
+
+        text = ", ".join(parts)
+        if strength is not None and strength != 1.0:
+            text = f"({text}:{strength:.2f})"
+        return text
+
+    def format_tag_object(self, tag, chain):
+        # formatTag in prompt.js, with nested groups expanded instead of referenced
+        kind = tag.get("type") or "tag"
+        name = tag["name"]
+        extension = tag.get("extension") if isinstance(tag.get("extension"), str) else ""
+        strength = _strength(tag.get("strength"))
+        if kind == "lora":
+            return format_lora(name + extension, strength)
+        if kind == "embedding":
+            return f"embedding:{name}"
+        if kind == "group":
+            return self.expand_group(name + extension, strength, chain)
+        return format_tag(name, strength)
+
+    def compile_token(self, token):
+        match = GROUP_TOKEN.match(token)
+        if match:
+            return self.expand_group(match.group(1).strip(), None, [])
+        match = WEIGHTED_GROUP_TOKEN.match(token)
+        if match:
+            return self.expand_group(match.group(1).strip(), _strength(match.group(2)), [])
+
+        match = LORA_TOKEN.match(token)
+        if match:
+            return format_lora(match.group(1), _strength(match.group(2)))
+        match = WEIGHTED_TOKEN.match(token)
+        if match and _strength(match.group(2)) is not None:
+            return format_tag(match.group(1).strip(), _strength(match.group(2)))
+        return token
+
+    def compile(self, text):
+        lines = []
+        for line in text.split('\n'):
+            parts = []
+            for token in TOKEN_SPLIT.split(line):
+                token = token.strip()
+                if token:
+                    compiled = self.compile_token(token)
+                    if compiled:
+                        parts.append(compiled)
+            lines.append(", ".join(parts))
+        return "\n".join(lines)
+
+def _compile(text):
+    # (dependencies, compiled prompt), memoized on the text and the groups it reads
+    with _compile_lock:
+        entry = _compile_cache.get(text)
+        if entry is not None:
+            _compile_cache.move_to_end(text)
+    if entry is not None:
+        dependencies, compiled = entry
+        if all(group_key(path) == key for path, key in dependencies):
+            return entry
+
+    compiler = PromptCompiler()
+    compiled = compiler.compile(text)
+    entry = (tuple(compiler.dependencies.items()), compiled)
+    with _compile_lock:
+        _compile_cache[text] = entry
+        _compile_cache.move_to_end(text)
+        while len(_compile_cache) > COMPILE_CACHE_SIZE:
+            _compile_cache.popitem(last=False)
+    return entry
+
+def compile_prompt(text):
+    return _compile(text)[1]
+
+def prompt_fingerprint(text):
+    # Changes when a group `text` reads is edited, created or removed,
+    # including nested ones and references to groups that don't exist yet
+    return repr(_compile(text)[0])
+
+class ErePromptCompiler:
+    @classmethod
+    def INPUT_TYPES(cls):
+        return {
+            "required": {
+                "prompt": ("STRING", {"forceInput": True})
+            },
+            "hidden": {"unique_id": "UNIQUE_ID"}
+        }
+
+    RETURN_TYPES = ("STRING", "LORA_STACK", "STRING")
+    RETURN_NAMES = ("prompt", "lora_stack", "filtered_prompt")
+    FUNCTION = "process"
+    CATEGORY = "EreNodes"
+
+    @classmethod
+    def IS_CHANGED(cls, prompt=None, unique_id=None, **kwargs):
+        # ComfyUI doesn't pass linked inputs here, so the node's prompt is the
+        # one it compiled last. Only the groups that prompt reads are checked.
+        if not isinstance(prompt, str):
+            prompt = _node_prompts.get(str(unique_id))
+        if prompt is None:
+            return ""
+        return prompt_fingerprint(prompt)
+
+    def process(self, prompt, unique_id=None):
+        _node_prompts[str(unique_id)] = prompt
+        compiled = compile_prompt(prompt)
+        lora_stack, filtered_prompt = prompt_to_lora_stack(compiled)
+        return (compiled, lora_stack, filtered_prompt)
+
+NODE_CLASS_MAPPINGS = {
+    "ErePromptCompiler": ErePromptCompiler,
+}
+
+NODE_DISPLAY_NAME_MAPPINGS = {
+    "ErePromptCompiler": "Prompt Compiler",
+}
@@ -1,10 +1,22 @@
 import os
 import csv
 import re
+import heapq
+import math
+import mmap
+import struct
+import sys
+import threading
+import time
 import server
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
 from aiohttp import web
 
+from .atomic_write import write_atomic
 from .settings import get_erenodes_settings
+from .workers import Superseded, run_blocking, supersede
 
 # Define constants for export
 CSV_FILES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "__autocomplete__")
@@ -17,10 +29,60 @@ TAG_TYPES = {
     5: "Meta"
 }
 
-TAG_DATA_CACHE = {}
+# Dictionaries stay resident after loading, only keep the most recent few
+TAG_CACHE_SIZE = 2
+TAG_DATA_CACHE = OrderedDict()
+
+class TagStore:
+    # Columnar tag dictionary. Counts and types are parallel arrays, names and
+    # the deduplicated alias strings are UTF-8 slices of one shared `text`
+    # buffer, and each row points at its alias ids through `alias_starts`.
+    def __init__(self, text, name_offsets, alias_offsets, alias_starts, alias_ids, counts, types):
+        self.text = text
+        self.name_offsets = name_offsets
+        self.alias_offsets = alias_offsets
+        self.alias_starts = alias_starts
+        self.alias_ids = alias_ids
+        self.counts = counts
+        self.types = types
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __getitem__(self, i):
+        return {'name': self.name(i), 'count': self.counts[i], 'aliases': self.aliases(i)}
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def decode(self, start, end):
+        return self.text[start:end].decode('utf-8')
+
+    def name_span(self, i):
+        return self.name_offsets[i], self.name_offsets[i + 1]
+
+    def alias_spans(self, i):
+        offsets = self.alias_offsets
+        return [(offsets[a], offsets[a + 1]) for a in self.alias_ids[self.alias_starts[i]:self.alias_starts[i + 1]]]
+
+    def key_spans(self, i):
+        return [self.name_span(i), *self.alias_spans(i)]
+
+    def name(self, i):
+        return self.decode(*self.name_span(i))
+
+    def aliases(self, i):
+        return [self.decode(start, end) for start, end in self.alias_spans(i)]
 
 def load_tags_from_csv(csv_path):
-    tags = []
+    names = bytearray()
+    name_offsets = array('I', [0])
+    alias_ids = array('I')
+    alias_starts = array('I', [0])
+    counts = array('I')
+    types = array('B')
+    unique_aliases = {}
+
     if csv_path and os.path.isfile(csv_path):
         try:
             with open(csv_path, newline='', encoding='utf-8') as csvfile:
@@ -31,76 +93,702 @@ def load_tags_from_csv(csv_path):
                         name = row[0].strip().lower().replace('_', ' ')
                         if not name: continue
                         count = int(row[2])
-                        
+                        tag_type = int(row[1]) if row[1].strip().isdigit() else 0
+
                         aliases = []
                         if len(row) >= 4 and row[3]:
                             aliases = [a.strip().lower().replace('_', ' ') for a in row[3].split(',') if a.strip()]
 
-                        tags.append({
-                            'name': name,
-                            'count': count,
-                            'aliases': aliases
-                        })
+                        names += name.encode('utf-8')
+                        name_offsets.append(len(names))
+                        for alias in aliases:
+                            alias_ids.append(unique_aliases.setdefault(alias, len(unique_aliases)))
+                        alias_starts.append(len(alias_ids))
+                        counts.append(min(max(count, 0), 0xFFFFFFFF))
+                        types.append(min(tag_type, 0xFF))
                     except (ValueError, IndexError):
                         continue
         except Exception as e:
             pass
-    
-    return tags
 
-def get_tag_data():
-    settings = get_erenodes_settings()
-    active_csv = settings.get('autocomplete.csv')
+    # Aliases follow the names in the same buffer, in first-seen order
+    alias_offsets = array('I', [len(names)])
+    for alias in unique_aliases:
+        names += alias.encode('utf-8')
+        alias_offsets.append(len(names))
+
+    return TagStore(bytes(names), name_offsets, alias_offsets, alias_starts, alias_ids, counts, types)
+
+def _grams(text, size):
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+def _gram_id(gram):
+    # Bigrams map below 2**16, trigrams get bit 24 set so the two never collide
+    return int.from_bytes(gram, 'big') | (len(gram) - 2) << 24
+
+# Ranking bonus per match tier. Tiers are TIER_STEP apart, more than the
+# largest popularity weight log10(count + 1) of a uint32 count (< 9.7), so
+# the tier always decides first and popularity only orders within a tier:
+# exact name, exact alias, name prefix, alias prefix, word starts, substrings.
+TIER_STEP = 10.0
+NAME_TIER_BONUS = {3: 7 * TIER_STEP, 2: 5 * TIER_STEP, 1: 3 * TIER_STEP, 0: TIER_STEP}
+ALIAS_TIER_BONUS = {3: 6 * TIER_STEP, 2: 4 * TIER_STEP, 1: 2 * TIER_STEP, 0: 0.0}
+
+# Bytes that continue a word when looking for word starts, non-ASCII counts as a letter
+WORD_BYTES = bytes(1 if chr(b).isalnum() or b >= 0x80 else 0 for b in range(256))
+
+def _match_tier(text, start, end, query):
+    # 3 exact, 2 prefix, 1 start of a word, 0 anywhere else, -1 no match
+    pos = text.find(query, start, end)
+    if pos < 0:
+        return -1
+    if pos == start:
+        return 3 if end - start == len(query) else 2
+    while pos > start:
+        if not WORD_BYTES[text[pos - 1]]:
+            return 1
+        pos = text.find(query, pos + 1, end)
+    return 0
+
+def _deletes(word, distance):
+    variants = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        variants |= frontier
+    return variants
+
+def _edit_distance(a, b, max_distance):
+    # Optimal string alignment distance (adjacent swaps cost 1). Only the
+    # diagonal band of width max_distance is filled, and anything beyond the
+    # bound comes back as max_distance + 1.
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    beyond = max_distance + 1
+    before = None
+    previous = [j if j <= max_distance else beyond for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        current = [beyond] * (len(b) + 1)
+        if i <= max_distance:
+            current[0] = i
+        best = current[0]
+        for j in range(max(1, i - max_distance), min(len(b), i + max_distance) + 1):
+            value = previous[j - 1] if a[i - 1] == b[j - 1] else previous[j - 1] + 1
+            if previous[j] + 1 < value:
+                value = previous[j] + 1
+            if current[j - 1] + 1 < value:
+                value = current[j - 1] + 1
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1] and before[j - 2] + 1 < value:
+                value = before[j - 2] + 1
+            current[j] = value if value < beyond else beyond
+            if value < best:
+                best = value
+        if best > max_distance:
+            return beyond
+        before, previous = previous, current
+    return previous[-1]
+
+class FuzzyIndex:
+    # Symmetric-delete dictionary over tag names. Names are grouped by their
+    # first PREFIX_LENGTH characters and every variant of a group prefix with
+    # up to MAX_DISTANCE characters deleted is hashed into one sorted array.
+    # A query looks up the same deletes of its own prefix, and only names in
+    # the groups it hits are checked with a real edit distance.
+    PREFIX_LENGTH = 5
+    MAX_DISTANCE = 2
+
+    def __init__(self, store):
+        self.store = store
+        names = [store.name(i) for i in range(len(store))]
+        self.rows = array('I', sorted(range(len(names)), key=names.__getitem__))
+
+        group_starts = array('I')
+        hashes = array('q')
+        groups = array('I')
+        previous = None
+        for position, i in enumerate(self.rows):
+            prefix = names[i][:self.PREFIX_LENGTH]
+            if prefix == previous:
+                continue
+            previous = prefix
+            group_starts.append(position)
+            for variant in _deletes(prefix, self.MAX_DISTANCE):
+                hashes.append(hash(variant))
+                groups.append(len(group_starts) - 1)
+        group_starts.append(len(self.rows))
+        self.group_starts = group_starts
+
+        # Sort one top-byte bucket at a time, a single sort over every variant
+        # would hold the GIL for a second and stall the server's event loop
+        buckets = [[] for _ in range(256)]
+        for j, key in enumerate(hashes):
+            buckets[(key >> 56) + 128].append(j)
+        self.hashes = array('q')
+        self.groups = array('I')
+        for bucket in buckets:
+            bucket.sort(key=hashes.__getitem__)
+            self.hashes.extend(hashes[j] for j in bucket)
+            self.groups.extend(groups[j] for j in bucket)
+
+    def search(self, query, limit, distance):
+        distance = min(distance, self.MAX_DISTANCE)
+
+        hit_groups = set()
+        for variant in _deletes(query[:self.PREFIX_LENGTH], distance):
+            key = hash(variant)
+            j = bisect_left(self.hashes, key)
+            while j < len(self.hashes) and self.hashes[j] == key:
+                hit_groups.add(self.groups[j])
+                j += 1
+
+        matches = []
+        seen_tags = set()
+        for group in hit_groups:
+            for i in self.rows[self.group_starts[group]:self.group_starts[group + 1]]:
+                name = self.store.name(i)
+                if name in seen_tags:
+                    continue
+                seen_tags.add(name)
+                found = _edit_distance(query, name, distance)
+                if found <= distance:
+                    matches.append((found, -self.store.counts[i], i))
+
+        return [dict(self.store[i], distance=found) for found, _, i in heapq.nsmallest(limit, matches)]
+
+class TagIndex:
+    # Search structures over a TagStore. Every name and alias is split into
+    # byte bigrams and trigrams, and each gram's rows are one slice of the
+    # flat `postings` array, so a substring query only verifies the rows
+    # posted under its rarest gram. All keys are also kept in sorted order
+    # (`prefix_*`), which turns exact and prefix matches into a range.
+    GRAM_SIZES = (2, 3)
+
+    def __init__(self, store, gram_ids, gram_offsets, postings, prefix_rows, prefix_starts, prefix_ends, weights):
+        self.store = store
+        self.gram_ids = gram_ids
+        self.gram_offsets = gram_offsets
+        self.postings = postings
+        self.prefix_rows = prefix_rows
+        self.prefix_starts = prefix_starts
+        self.prefix_ends = prefix_ends
+        self.weights = weights
+
+        # Only built on the first fuzzy query, most sessions never need it.
+        # Concurrent first queries wait for one build instead of each building.
+        self.fuzzy_index = None
+        self.fuzzy_lock = threading.Lock()
+        # (mtime_ns, size) of the CSV this was loaded from, see get_tag_index
+        self.source = None
+
+    @classmethod
+    def build(cls, store):
+        text = store.text
+
+        postings = {}
+        for i in range(len(store)):
+            keys = [text[start:end] for start, end in store.key_spans(i)]
+            for gram in {key[j:j + size] for key in keys for size in cls.GRAM_SIZES for j in range(len(key) - size + 1)}:
+                rows = postings.get(gram)
+                if rows is None:
+                    postings[gram] = [i]
+                else:
+                    rows.append(i)
+
+        # Row ids are appended in file order, so every posting slice stays sorted
+        grams = sorted((_gram_id(gram), gram) for gram in postings)
+        gram_ids = array('I', (gram_id for gram_id, _ in grams))
+        gram_offsets = array('I', [0])
+        flat = array('I')
+        for _, gram in grams:
+            flat.extend(postings.pop(gram))
+            gram_offsets.append(len(flat))
+
+        keyed = sorted((text[start:end], i, start, end) for i in range(len(store)) for start, end in store.key_spans(i))
+        prefix_rows = array('I', (i for _, i, _, _ in keyed))
+        prefix_starts = array('I', (start for _, _, start, _ in keyed))
+        prefix_ends = array('I', (end for _, _, _, end in keyed))
+
+        weights = array('d', (math.log10(count + 1) for count in store.counts))
+
+        return cls(store, gram_ids, gram_offsets, memoryview(flat), prefix_rows, prefix_starts, prefix_ends, weights)
+
+    def posting(self, gram):
+        gram_id = _gram_id(gram)
+        k = bisect_left(self.gram_ids, gram_id)
+        if k == len(self.gram_ids) or self.gram_ids[k] != gram_id:
+            return None
+        return self.postings[self.gram_offsets[k]:self.gram_offsets[k + 1]]
+
+    def candidates(self, query):
+        size = min(len(query), self.GRAM_SIZES[-1])
+        if size < self.GRAM_SIZES[0]:
+            return range(len(self.store))
+
+        best = None
+        for gram in _grams(query, size):
+            rows = self.posting(gram)
+            if rows is None:
+                return ()
+            if best is None or len(rows) < len(best):
+                best = rows
+        return best
+
+    def matches(self, i, query):
+        text = self.store.text
+        return any(text.find(query, start, end) >= 0 for start, end in self.store.key_spans(i))
+
+    def search(self, query, limit):
+        query = query.encode('utf-8')
+        text = self.store.text
+        results = []
+        seen_tags = set()
+
+        for i in self.candidates(query):
+            if len(results) >= limit:
+                break
+
+            if not self.matches(i, query):
+                continue
+
+            tag_name = text[slice(*self.store.name_span(i))]
+            if tag_name in seen_tags:
+                continue
+
+            results.append(self.store[i])
+            seen_tags.add(tag_name)
+
+        return results
+
+    def bisect_key(self, probe, lo=0, right=False):
+        # Binary search over the sorted keys, like bisect_left/bisect_right
+        text, starts, ends = self.store.text, self.prefix_starts, self.prefix_ends
+        hi = len(self.prefix_rows)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            key = text[starts[mid]:ends[mid]]
+            if key < probe or (right and key == probe):
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def prefix_range(self, query):
+        # Keys equal to the query sort first, followed by the longer prefix
+        # matches. UTF-8 never contains 0xff, so it bounds every continuation.
+        lo = self.bisect_key(query)
+        return lo, self.bisect_key(query, lo, right=True), self.bisect_key(query + b'\xff', lo)
+
+    def longest_match(self, words, start):
+        # Number of words from words[start] that form the longest name or
+        # alias, 0 if none. The sorted keys work as a trie here: every word
+        # narrows the range, and it stops once no key starts with the phrase.
+        text, starts, ends = self.store.text, self.prefix_starts, self.prefix_ends
+        lo = 0
+        found = 0
+        phrase = b''
+        for end in range(start, len(words)):
+            phrase = phrase + b' ' + words[end] if phrase else words[end]
+            lo = self.bisect_key(phrase, lo)
+            if lo == len(starts) or not text[starts[lo]:ends[lo]].startswith(phrase):
+                break
+            if ends[lo] - starts[lo] == len(phrase):
+                found = end - start + 1
+        return found
+
+    def resolve(self, key):
+        # (name_row, alias_row) for an exact key: the first row named `key`
+        # and the last row listing it as an alias, None where there is none.
+        # An alias maps to its tag even when the key is also a name, and the
+        # last row wins, like the dictionary Prompt Filter always built.
+        key = key.encode('utf-8')
+        lo, hi, _ = self.prefix_range(key)
+        name_row = None
+        alias_row = None
+        for j in range(lo, hi):
+            row = self.prefix_rows[j]
+            if self.prefix_starts[j] == self.store.name_offsets[row]:
+                if name_row is None or row < name_row:
+                    name_row = row
+            elif alias_row is None or row > alias_row:
+                alias_row = row
+        return name_row, alias_row
+
+    def score(self, i, query):
+        # Best match tier across name and aliases, weighted by popularity
+        text = self.store.text
+        bonus = NAME_TIER_BONUS.get(_match_tier(text, *self.store.name_span(i), query))
+        for start, end in self.store.alias_spans(i):
+            alias_bonus = ALIAS_TIER_BONUS.get(_match_tier(text, start, end, query))
+            if alias_bonus is not None and (bonus is None or alias_bonus > bonus):
+                bonus = alias_bonus
+        if bonus is None:
+            return None
+        return bonus + self.weights[i]
+
+    def push_top(self, heap, seen_tags, rows, query, limit, ceiling):
+        # Bounded min-heap of the best `limit` rows. `ceiling` is the highest
+        # bonus any of `rows` can reach, so rows whose count can't lift them
+        # past the current k-th score are skipped without being scored.
+        text = self.store.text
+        weights = self.weights
+        for i in rows:
+            if len(heap) >= limit and ceiling + weights[i] <= heap[0][0]:
+                continue
+
+            tag_name = text[slice(*self.store.name_span(i))]
+            if tag_name in seen_tags:
+                continue
+            seen_tags.add(tag_name)
+
+            score = self.score(i, query)
+            if score is None:
+                continue
+
+            # Ties go to the row that comes first in the file
+            item = (score, -i)
+            if len(heap) < limit:
+                heapq.heappush(heap, item)
+            elif item > heap[0]:
+                heapq.heapreplace(heap, item)
+
+    def rank(self, query, limit):
+        if limit <= 0:
+            return []
+
+        query = query.encode('utf-8')
+        heap = []
+        seen_tags = set()
+        lo, exact_hi, hi = self.prefix_range(query)
+        self.push_top(heap, seen_tags, self.prefix_rows[lo:exact_hi], query, limit, NAME_TIER_BONUS[3])
+        self.push_top(heap, seen_tags, self.prefix_rows[exact_hi:hi], query, limit, NAME_TIER_BONUS[2])
+        # Single characters would score the whole dictionary, prefixes are enough there
+        if len(query) >= self.GRAM_SIZES[0]:
+            self.push_top(heap, seen_tags, self.candidates(query), query, limit, NAME_TIER_BONUS[1])
+
+        return [self.store[-neg_row] for _, neg_row in sorted(heap, reverse=True)]
+
+    def fuzzy(self, query, limit, distance):
+        # Short queries are within two edits of almost everything
+        if len(query) < 3 or limit <= 0:
+            return []
+        if len(query) <= 4:
+            distance = min(distance, 1)
+
+        if self.fuzzy_index is None:
+            with self.fuzzy_lock:
+                if self.fuzzy_index is None:
+                    self.fuzzy_index = FuzzyIndex(self.store)
+        return self.fuzzy_index.search(query, limit, distance)
+
+# Compiled dictionaries live next to their CSV as `<name>.csv.idx`. The file
+# holds every TagStore and TagIndex column back to back, `text` first at
+# offset 0 so the mapped file itself serves as the text buffer, followed by
+# a table of (offset, size) per section and a fixed footer. The footer
+# records the CSV's mtime and size, so an edited CSV is recompiled.
+COMPILED_SUFFIX = ".idx"
+COMPILED_MAGIC = b"ERETAGS"
+COMPILED_VERSION = 1
+STORE_SECTIONS = (
+    ("text", "B"), ("name_offsets", "I"), ("alias_offsets", "I"), ("alias_starts", "I"),
+    ("alias_ids", "I"), ("counts", "I"), ("types", "B"),
+)
+INDEX_SECTIONS = (
+    ("gram_ids", "I"), ("gram_offsets", "I"), ("postings", "I"),
+    ("prefix_rows", "I"), ("prefix_starts", "I"), ("prefix_ends", "I"), ("weights", "d"),
+)
+COMPILED_SECTION = struct.Struct("<QQ")
+COMPILED_FOOTER = struct.Struct("<7sBB?qq")
+
+def save_compiled_index(index, compiled_path, source_stat):
+    sections = [getattr(index.store, name) for name, _ in STORE_SECTIONS]
+    sections += [getattr(index, name) for name, _ in INDEX_SECTIONS]
+
+    def write(f):
+        table = []
+        for data in sections:
+            f.write(b"\0" * (-f.tell() % 8))
+            table.append((f.tell(), memoryview(data).nbytes))
+            f.write(data)
+        for offset, size in table:
+            f.write(COMPILED_SECTION.pack(offset, size))
+        f.write(COMPILED_FOOTER.pack(COMPILED_MAGIC, COMPILED_VERSION, len(table), sys.byteorder == "little",
+                                     source_stat.st_mtime_ns, source_stat.st_size))
+
+    # Failing on a read-only install or a file mapped elsewhere is fine, the
+    # index still works from memory
+    write_atomic(compiled_path, write)
+
+def load_compiled_index(compiled_path, source_stat):
+    try:
+        with open(compiled_path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    sections = STORE_SECTIONS + INDEX_SECTIONS
+    table_size = len(sections) * COMPILED_SECTION.size
+    if len(mapped) < COMPILED_FOOTER.size + table_size:
+        return None
+
+    magic, version, count, little_endian, mtime_ns, size = COMPILED_FOOTER.unpack(mapped[-COMPILED_FOOTER.size:])
+    if (magic, version, count, little_endian) != (COMPILED_MAGIC, COMPILED_VERSION, len(sections), sys.byteorder == "little"):
+        return None
+    if (mtime_ns, size) != (source_stat.st_mtime_ns, source_stat.st_size):
+        return None
+
+    # A damaged section table means the file is rebuilt from the CSV, an
+    # exception here would leave the dictionary failed until restart
+    view = memoryview(mapped)
+    table_start = len(mapped) - COMPILED_FOOTER.size - table_size
+    columns = {}
+    try:
+        for k, (name, typecode) in enumerate(sections):
+            offset, nbytes = COMPILED_SECTION.unpack_from(mapped, table_start + k * COMPILED_SECTION.size)
+            if offset + nbytes > table_start or (name == "text" and offset != 0):
+                return None
+            columns[name] = mapped if name == "text" else view[offset:offset + nbytes].cast(typecode)
+    except (TypeError, ValueError):
+        return None
+    rows = len(columns["counts"])
+    if not len(columns["name_offsets"]) == len(columns["alias_starts"]) == rows + 1:
+        return None
+    if len(columns["types"]) != rows or len(columns["weights"]) != rows:
+        return None
+
+    store = TagStore(*(columns[name] for name, _ in STORE_SECTIONS))
+    return TagIndex(store, *(columns[name] for name, _ in INDEX_SECTIONS))
+
+def source_key(csv_path):
+    try:
+        source_stat = os.stat(csv_path)
+    except OSError:
+        return None
+    return source_stat.st_mtime_ns, source_stat.st_size
+
+def load_tag_index(csv_path):
+    try:
+        source_stat = os.stat(csv_path)
+    except OSError:
+        return TagIndex.build(load_tags_from_csv(csv_path))
+
+    compiled_path = csv_path + COMPILED_SUFFIX
+    index = load_compiled_index(compiled_path, source_stat)
+    if index is None:
+        index = TagIndex.build(load_tags_from_csv(csv_path))
+        save_compiled_index(index, compiled_path, source_stat)
+    index.source = (source_stat.st_mtime_ns, source_stat.st_size)
+    return index
+
+def csv_file_path(csv_file):
+    # Path of a dictionary in __autocomplete__, None for anything but the plain
+    # name of an existing .csv file there. The compiled index is written next
+    # to it, so client supplied names must not reach other directories.
+    if not isinstance(csv_file, str) or not csv_file.lower().endswith(".csv"):
+        return None
+    if os.path.basename(csv_file) != csv_file or '/' in csv_file or '\\' in csv_file:
+        return None
+    csv_path = os.path.join(CSV_FILES_PATH, csv_file)
+    return csv_path if os.path.isfile(csv_path) else None
+
+def get_active_csv():
+    return get_erenodes_settings().get('autocomplete.csv')
+
+# Per CSV: state is "loading", "ready" or "failed", with timings for the frontend
+TAG_LOAD_STATUS = {}
+TAG_CACHE_LOCK = threading.Lock()
+TAG_LOAD_LOCKS = {}
+
+def get_tag_index(active_csv=None, wait=True):
+    # Shared by autocomplete and the Prompt Filter node, so each CSV is parsed
+    # once per process. An entry is dropped as soon as its CSV's mtime or size
+    # changes, the next caller (or warm_tag_index) then reloads it.
+    active_csv = active_csv or get_active_csv()
 
     if not active_csv:
-        return []
+        return None
 
-    if active_csv in TAG_DATA_CACHE:
-        return TAG_DATA_CACHE[active_csv]
+    csv_path = csv_file_path(active_csv)
+    if csv_path is None:
+        return None
+    current = source_key(csv_path)
+    with TAG_CACHE_LOCK:
+        if active_csv in TAG_DATA_CACHE:
+            if TAG_DATA_CACHE[active_csv].source == current:
+                TAG_DATA_CACHE.move_to_end(active_csv)
+                return TAG_DATA_CACHE[active_csv]
+            del TAG_DATA_CACHE[active_csv]
+        if not wait:
+            return None
+        load_lock = TAG_LOAD_LOCKS.setdefault(active_csv, threading.Lock())
 
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    autocomplete_dir = os.path.join(base_dir, "..", "__autocomplete__")
-    csv_path = os.path.join(autocomplete_dir, active_csv)
+    # Only one thread loads a given CSV, everyone else waits for its result
+    with load_lock:
+        with TAG_CACHE_LOCK:
+            if active_csv in TAG_DATA_CACHE:
+                return TAG_DATA_CACHE[active_csv]
 
-    tags = load_tags_from_csv(csv_path)
-    TAG_DATA_CACHE[active_csv] = tags
-    return tags
+        started = time.time()
+        TAG_LOAD_STATUS[active_csv] = {"state": "loading", "started": started}
+        try:
+            index = load_tag_index(csv_path)
+        except Exception as e:
+            TAG_LOAD_STATUS[active_csv] = {"state": "failed", "started": started, "seconds": time.time() - started,
+                                           "error": str(e), "source_key": current}
+            return None
+
+        with TAG_CACHE_LOCK:
+            TAG_DATA_CACHE[active_csv] = index
+            while len(TAG_DATA_CACHE) > TAG_CACHE_SIZE:
+                TAG_DATA_CACHE.popitem(last=False)
+        TAG_LOAD_STATUS[active_csv] = {
+            "state": "ready",
+            "started": started,
+            "seconds": time.time() - started,
+            "tags": len(index.store),
+            "source": "compiled" if isinstance(index.store.text, mmap.mmap) else "csv",
+        }
+        return index
+
+def warm_tag_index(active_csv=None):
+    # Load and index a dictionary on a background thread so no request has to wait for it
+    active_csv = active_csv or get_active_csv()
+    if not active_csv or csv_file_path(active_csv) is None:
+        return None
+    if active_csv not in TAG_LOAD_STATUS:
+        TAG_LOAD_STATUS[active_csv] = {"state": "loading", "started": time.time()}
+    thread = threading.Thread(target=get_tag_index, args=(active_csv,), name=f"erenodes-warm-{active_csv}", daemon=True)
+    thread.start()
+    return thread
+
+def get_tag_data(active_csv=None):
+    index = get_tag_index(active_csv)
+    return index.store if index is not None else []
+
+# Batch lookups accept a raw prompt: split on commas and newlines, skip
+# LoRA/embedding/group references and unwrap "(tag:1.2)" weights
+MAX_BATCH_QUERIES = 1000
+PROMPT_SPLIT = re.compile(r'[,\n]')
+PROMPT_WEIGHT = re.compile(r'^\((.*):[\d.]+\)$')
+
+def normalize_tag(text):
+    return text.lower().strip().replace('_', ' ')
+
+def prompt_tokens(prompt):
+    tokens = []
+    for token in PROMPT_SPLIT.split(prompt):
+        token = token.strip()
+        if not token or token.startswith(('<', 'embedding:', 'group:')):
+            continue
+        weighted = PROMPT_WEIGHT.match(token)
+        if weighted:
+            token = weighted.group(1).strip()
+        tokens.append(token)
+    return tokens
+
+def resolve_batch(index, queries, mode, limit, distance=FuzzyIndex.MAX_DISTANCE):
+    # Repeated tokens are looked up once and share the same result
+    resolved = {}
+    results = []
+    for query in queries:
+        tag = normalize_tag(query)
+        if tag not in resolved:
+            entry = {"canonical": None, "alias": False, "count": None, "matches": []}
+            name_row, alias_row = index.resolve(tag) if tag else (None, None)
+            row = alias_row if alias_row is not None else name_row
+            if row is not None:
+                entry.update(canonical=index.store.name(row), alias=alias_row is not None, count=index.store.counts[row])
+            if tag and limit > 0:
+                entry["matches"] = search_index(index, tag, mode, limit, distance)
+            resolved[tag] = entry
+        results.append({"query": query, "tag": tag, **resolved[tag]})
+    return results
+
+def search_index(index, query, mode, limit, distance=FuzzyIndex.MAX_DISTANCE):
+    if mode == "rank":
+        return index.rank(query, limit)
+    if mode == "fuzzy":
+        return index.fuzzy(query, limit, distance)
+    return index.search(query, limit)
+
+def get_ready_tag_index():
+    # Don't hold the event loop while a dictionary is still loading, the
+    # frontend polls /erenodes/tags_status and retries once it is ready
+    index = get_tag_index(wait=False)
+    if index is None:
+        active_csv = get_active_csv()
+        status = TAG_LOAD_STATUS.get(active_csv, {})
+        # A dictionary that failed to load is only retried once its CSV changed,
+        # not on every keystroke, or when it is selected again in the settings
+        failed = status.get("state") == "failed" and status.get("source_key") == source_key(csv_file_path(active_csv) or "")
+        if active_csv and status.get("state") != "loading" and not failed:
+            warm_tag_index(active_csv)
+    return index
+
+@server.PromptServer.instance.routes.get("/erenodes/tags_status")
+async def tags_status(request):
+    active_csv = request.query.get("csv") or get_active_csv()
+    if not active_csv:
+        return web.json_response({"csv": None, "state": "none"})
+
+    status = TAG_LOAD_STATUS.get(active_csv, {"state": "idle"})
+    return web.json_response({"csv": active_csv, **status})
 
 @server.PromptServer.instance.routes.get("/erenodes/search_tags")
 async def search_tags(request):
     query = request.query.get("query", "").lower().strip().replace('_', ' ')
-    limit = int(request.query.get("limit", 10))
+    mode = request.query.get("mode", "substring")
+    try:
+        limit = int(request.query.get("limit", 10))
+        distance = int(request.query.get("distance", FuzzyIndex.MAX_DISTANCE))
+    except ValueError:
+        return web.json_response({"error": "Invalid limit or distance"}, status=400)
 
     if not query or len(query) < 1:
         return web.json_response([])
 
-    all_tags = get_tag_data()
-    
-    results = []
-    seen_tags = set()
+    index = get_ready_tag_index()
+    if index is None:
+        return web.json_response([])
 
-    for tag in all_tags:
-        if len(results) >= limit:
-            break
+    # Typing sends a request per keystroke, only the newest one per menu is answered
+    cancelled = supersede(request.query.get("channel"))
+    try:
+        results = await run_blocking(search_index, index, query, mode, limit, distance, cancelled=cancelled)
+    except Superseded:
+        return web.json_response([])
+    return web.json_response(results)
 
-        tag_name = tag.get('name')
-        if not tag_name or tag_name in seen_tags:
-            continue
+@server.PromptServer.instance.routes.post("/erenodes/search_tags_batch")
+async def search_tags_batch(request):
+    try:
+        data = await request.json()
+    except Exception:
+        return web.json_response({"error": "Invalid JSON body"}, status=400)
 
-        # Check for matches
-        match_found = False
-        if query in tag_name:
-            match_found = True
-        
-        if not match_found:
-            for alias in tag.get('aliases', []):
-                if query in alias:
-                    match_found = True
-                    break
-        
-        if match_found:
-            results.append(tag)
-            seen_tags.add(tag_name)
-            
-    return web.json_response(results)
+    if not isinstance(data, dict):
+        return web.json_response({"error": "Expected a JSON object"}, status=400)
+
+    queries = data.get("queries")
+    if queries is None and isinstance(data.get("prompt"), str):
+        queries = prompt_tokens(data["prompt"])
+    if not isinstance(queries, list):
+        return web.json_response({"error": "Provide 'queries' as a list or 'prompt' as a string"}, status=400)
+
+    queries = [str(query) for query in queries[:MAX_BATCH_QUERIES]]
+    mode = data.get("mode", "rank")
+    try:
+        limit = int(data.get("limit", 5))
+        distance = int(data.get("distance", FuzzyIndex.MAX_DISTANCE))
+    except (TypeError, ValueError):
+        return web.json_response({"error": "Invalid limit or distance"}, status=400)
+
+    index = get_ready_tag_index()
+    if index is None:
+        return web.json_response({"ready": False, "results": []})
+
+    results = await run_blocking(resolve_batch, index, queries, mode, limit, distance)
+    return web.json_response({"ready": True, "results": results})
 
+# Start loading the active dictionary as soon as the extension is imported
+warm_tag_index()
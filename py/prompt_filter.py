@@ -1,8 +1,150 @@
 import os
-import csv
 import re
 from .prompt_api import get_erenodes_settings
-from .prompt_csv import get_tag_data
+from .prompt_csv import CSV_FILES_PATH, get_tag_index, source_key
+
+# Prompt tokenizer. A token is one comma or newline separated entry, it is
+# cleaned in a single scan: markup removal, then ":weight" suffixes, then
+# the surrounding brackets and "\\(" escapes.
+TOKEN_SPLIT = re.compile(r'[,\n]')
+# LoRA and other "<...>" markup is rare, these only run on tokens containing it
+LORA_TAG = re.compile(r'<lora:[^:>]+(:[^:>]+){1,2}>')
+LORA_CALL = re.compile(r'lora\([^)]+\)')
+ANGLE_TAG = re.compile(r'<[^>]+>')
+WEIGHT_CHARS = frozenset('.0123456789')
+# Free text mode looks for known tags inside a token, word by word. Words
+# lose surrounding punctuation, emphasis brackets and escapes, so
+# "(blue eyes:1.2)" in the middle of a sentence still reads "blue eyes".
+WORD_PUNCTUATION = '.,;:!?"\'()[]{}\\'
+MATCH_MODES = ["Whole tokens", "Free text"]
+# Single letters like "a" are aliases in some dictionaries but noise in prose
+MIN_PHRASE_LENGTH = 2
+BRACKETS = {'(': ')', '[': ']', '{': '}'}
+
+def _is_word(ch):
+    return ch.isalnum() or ch in '_- '
+
+def _is_weight(ch):
+    return ch in WEIGHT_CHARS or ch.isdecimal()
+
+def _strip_weights(token):
+    # Drop every ":1.2" that directly follows a word character. A weight's
+    # own digits don't count, so "a:1:2" keeps its second suffix.
+    colon = token.find(':')
+    if colon < 0:
+        return token
+
+    pieces = []
+    start = 0
+    consumed = 0
+    length = len(token)
+    while colon >= 0:
+        end = colon + 1
+        while end < length and _is_weight(token[end]):
+            end += 1
+        if end > colon + 1 and colon > consumed and _is_word(token[colon - 1]):
+            pieces.append(token[start:colon])
+            start = consumed = end
+        colon = token.find(':', end if end > colon + 1 else colon + 1)
+    pieces.append(token[start:])
+    return ''.join(pieces)
+
+def _is_weighted(inner, bracket):
+    # `inner` is "<text>:<weight>" with no `bracket` characters in it
+    if bracket[0] in inner or bracket[1] in inner:
+        return False
+    end = len(inner)
+    while end > 0 and _is_weight(inner[end - 1]):
+        end -= 1
+    return end < len(inner) and end >= 2 and inner[end - 1] == ':'
+
+def _unwrap(token):
+    # Up to "(((...)))" and "((...))", then one bracketed "text:weight",
+    # then any single pair of brackets
+    if len(token) >= 6 and token.startswith('(((') and token.endswith(')))'):
+        token = token[3:-3]
+    if len(token) >= 4 and token.startswith('((') and token.endswith('))'):
+        token = token[2:-2]
+    for bracket in ('()', '[]', '{}'):
+        if len(token) >= 2 and token[0] == bracket[0] and token[-1] == bracket[1] and _is_weighted(token[1:-1], bracket):
+            token = token[1:-1]
+    if len(token) >= 2 and token[0] in BRACKETS and token[-1] in ')]}':
+        token = token[1:-1]
+    return token
+
+def clean_token(token):
+    if '<' in token or 'lora(' in token:
+        token = ANGLE_TAG.sub('', LORA_CALL.sub('', LORA_TAG.sub('', token)))
+    token = _unwrap(_strip_weights(token))
+    if '\\' in token:
+        token = token.replace('\\(', '(').replace('\\)', ')')
+    return token.strip()
+
+def _filter_token(token, index, alias_handling):
+    # Output tags for one cleaned token
+    name_row, alias_row = index.resolve(token)
+    is_tag = name_row is not None
+    is_alias = alias_row is not None
+    if is_alias:
+        main = index.store.name(alias_row)
+    else:
+        main = token if is_tag else None
+
+    if alias_handling == "Use alias" and is_alias:
+        return [token]
+    elif alias_handling == "Use main" and main:
+        return [main]
+    elif alias_handling == "Use both" and is_alias and main:
+        return [main, token]
+    elif is_tag:
+        return [token]
+    return []
+
+def _clean_word(word):
+    word = word.strip(WORD_PUNCTUATION)
+    head, colon, weight = word.rpartition(':')
+    if colon and head and weight and all(_is_weight(ch) for ch in weight):
+        word = head.strip(WORD_PUNCTUATION)
+    return word
+
+def match_phrases(text, index):
+    # Longest known tags in free text, left to right and without overlaps,
+    # e.g. "a girl with long hair" -> ["girl", "long hair"]
+    words = [_clean_word(word) for word in text.split()]
+    keys = [word.encode('utf-8') for word in words]
+    phrases = []
+    i = 0
+    while i < len(words):
+        length = index.longest_match(keys, i) if words[i] else 0
+        phrase = ' '.join(words[i:i + length])
+        if len(phrase) >= MIN_PHRASE_LENGTH:
+            phrases.append(phrase)
+            i += length
+        else:
+            i += 1
+    return phrases
+
+def _filter_text(token, index, alias_handling):
+    return [tag for phrase in match_phrases(token, index) for tag in _filter_token(phrase, index, alias_handling)]
+
+def filter_prompt(prompt, index, alias_handling, resolved=None, free_text=False):
+    # `resolved` maps raw tokens to their output tags, pass the same dict to
+    # share lookups between prompts filtered with the same index and mode
+    if resolved is None:
+        resolved = {}
+    filter_token = _filter_text if free_text else _filter_token
+
+    result_tags = []
+    for token in TOKEN_SPLIT.split(prompt):
+        token = token.strip()
+        if not token:
+            continue
+        tags = resolved.get(token)
+        if tags is None:
+            tags = resolved[token] = filter_token(clean_token(token), index, alias_handling)
+        result_tags.extend(tags)
+
+    return ', '.join(dict.fromkeys(result_tags))
 
 class ErePromptFilter:
     @classmethod
@@ -20,82 +162,73 @@ class ErePromptFilter:
                     {"default": "Use alias"},
                 ),
             },
+            "optional": {
+                "match_mode": (MATCH_MODES, {"default": "Whole tokens"}),
+            },
         }
 
     RETURN_TYPES = ("STRING",)
     FUNCTION = "process"
     CATEGORY = "EreNodes"
 
-    def process(self, prompt: str, csv_file: str, alias_handling: str):
+    @classmethod
+    def IS_CHANGED(cls, csv_file=None, **kwargs):
+        # The prompt and alias handling are regular inputs ComfyUI already
+        # compares, the only outside state is the dictionary file itself
+        if not csv_file:
+            return ""
+        return str(source_key(os.path.join(CSV_FILES_PATH, csv_file)))
+
+    def process(self, prompt: str, csv_file: str, alias_handling: str, match_mode: str = "Whole tokens"):
         prompt = prompt.lower().replace("_", " ")
-        tokens = [t.strip() for t in re.split(r'[,\n]', prompt) if t.strip()]
 
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        autocomplete_dir = os.path.join(base_dir, "..", "__autocomplete__")
-        selected_csv = os.path.join(autocomplete_dir, csv_file)
-
-        alias_map = {}
-        canonical_map = {}
-        tag_set = set()
-
-        if selected_csv and os.path.isfile(selected_csv):
-            try:
-                with open(selected_csv, newline='', encoding='utf-8') as csvfile:
-                    reader = csv.reader(csvfile)
-                    next(reader, None)  # Skip header
-                    for row in reader:
-                        if len(row) < 4:
-                            continue
-                        tag = row[0].strip().lower().replace('_', ' ')
-                        tag_set.add(tag)
-                        canonical_map[tag] = tag
-                        aliases = row[3]
-                        if aliases:
-                            for alias in aliases.split(','):
-                                alias = alias.strip().lower().replace('_', ' ')
-                                alias_map[alias] = tag
-            except Exception as e:
-                return (prompt,)
-        else:
+        selected_csv = os.path.join(CSV_FILES_PATH, csv_file)
+        if not os.path.isfile(selected_csv):
+            return (prompt,)
+
+        # Same cached index the autocomplete uses, parsed once per CSV version
+        index = get_tag_index(csv_file)
+        if index is None:
             return (prompt,)
 
-        result_tags = []
-        for token in tokens:
-            token = re.sub(r'<lora:[^:>]+(:[^:>]+){1,2}>', '', token)
-            token = re.sub(r'lora\([^)]+\)', '', token)
-            token = re.sub(r'<[^>]+>', '', token)
-            token = re.sub(r'([\w\- ]+):[\d.]+', r'\1', token)
+        return (filter_prompt(prompt, index, alias_handling, free_text=match_mode == "Free text"),)
 
-            token = re.sub(r'^\(\(\((.*?)\)\)\)$', r'\1', token)
-            token = re.sub(r'^\(\((.*?)\)\)$', r'\1', token)
-            token = re.sub(r'^\(([^\(\)]+:[\d.]+)\)$', r'\1', token)
-            token = re.sub(r'^\[([^\[\]]+:[\d.]+)\]$', r'\1', token)
-            token = re.sub(r'^\{([^{}]+:[\d.]+)\}$', r'\1', token)
-            token = re.sub(r'^[\(\[\{](.*?)[\)\]\}]$', r'\1', token)
+class ErePromptFilterBatch(ErePromptFilter):
+    # Filters a whole list of prompts in one call. The dictionary is looked
+    # up once and tokens repeated across the batch are only resolved once.
+    INPUT_IS_LIST = True
+    OUTPUT_IS_LIST = (True,)
+
+    @classmethod
+    def IS_CHANGED(cls, csv_file=None, **kwargs):
+        return super().IS_CHANGED(csv_file=csv_file[0] if csv_file else None)
 
-            token = token.replace(r'\(', '(').replace(r'\)', ')').strip()
+    def process(self, prompt: list, csv_file: list, alias_handling: list, match_mode: list = None):
+        csv_file = csv_file[0]
+        alias_handling = alias_handling[0]
+        free_text = bool(match_mode) and match_mode[0] == "Free text"
+        prompts = [p.lower().replace("_", " ") for p in prompt]
 
-            base = alias_map.get(token, token)
-            main = canonical_map.get(base)
+        selected_csv = os.path.join(CSV_FILES_PATH, csv_file)
+        if not os.path.isfile(selected_csv):
+            return (prompts,)
 
-            if alias_handling == "Use alias" and token in alias_map:
-                result_tags.append(token)
-            elif alias_handling == "Use main" and main:
-                result_tags.append(main)
-            elif alias_handling == "Use both" and token in alias_map and main:
-                result_tags.extend([main, token])
-            elif token in tag_set:
-                result_tags.append(token)
+        index = get_tag_index(csv_file)
+        if index is None:
+            return (prompts,)
 
-        return (', '.join(dict.fromkeys(result_tags)),)
+        resolved = {}
+        return ([filter_prompt(p, index, alias_handling, resolved, free_text) for p in prompts],)
 
 
 NODE_CLASS_MAPPINGS = {
     "ErePromptFilter": ErePromptFilter,
+    "ErePromptFilterBatch": ErePromptFilterBatch,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
     "ErePromptFilter": "Prompt Filter",
+    "ErePromptFilterBatch": "Prompt Filter (Batch)",
 }
 
 __all__ = [
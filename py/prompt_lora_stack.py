@@ -1,6 +1,38 @@
 import re
 import os
 
+# Regex to find <lora:filename:strength>
+LORA_REGEX = re.compile(r"<lora:([^:]+):([0-9.]+)>")
+# A run of commas and the whitespace around them, same as normalizing each
+# comma to ', ' and then collapsing repeats
+COMMA_RUN = re.compile(r'\s*,[\s,]*')
+
+def lora_filename(name):
+    filename = os.path.normpath(name)
+    if not (filename.endswith('.safetensors') or filename.endswith('.pt')):
+        filename += '.safetensors'
+    return filename
+
+def prompt_to_lora_stack(prompt, filenames=None):
+    # `filenames` caches resolved LoRA names, share it across a batch
+    if filenames is None:
+        filenames = {}
+
+    lora_stack = []
+    for name, strength in LORA_REGEX.findall(prompt):
+        filename = filenames.get(name)
+        if filename is None:
+            filename = filenames[name] = lora_filename(name)
+        strength = float(strength)
+        # ComfyUI's LoRA stack format: (lora_name, model_strength, clip_strength)
+        lora_stack.append((filename, strength, strength))
+    # Remove lora tags from the text
+    cleaned_text = LORA_REGEX.sub('', prompt)
+    # Normalize commas: ensure ', ' as separator, collapse multiple commas, strip
+    cleaned_text = COMMA_RUN.sub(', ', cleaned_text)
+    cleaned_text = cleaned_text.strip(', ').strip()
+    return lora_stack, cleaned_text
+
 class ErePromptLoraStack:
     @classmethod
     def INPUT_TYPES(cls):
@@ -16,29 +48,24 @@ class ErePromptLoraStack:
     CATEGORY = "EreNodes"
 
     def process(self, prompt):
-        lora_stack = []
-        # Regex to find <lora:filename:strength>
-        lora_regex = r"<lora:([^:]+):([0-9.]+)>"
-        matches = re.findall(lora_regex, prompt)
-        for match in matches:
-            filename = os.path.normpath(match[0])
-            strength = float(match[1])
-            if not (filename.endswith('.safetensors') or filename.endswith('.pt')):
-                filename += '.safetensors'
-            # ComfyUI's LoRA stack format: (lora_name, model_strength, clip_strength)
-            lora_stack.append((filename, strength, strength))
-        # Remove lora tags from the text
-        cleaned_text = re.sub(lora_regex, '', prompt)
-        # Normalize commas: ensure ', ' as separator, collapse multiple commas, strip
-        cleaned_text = re.sub(r'\s*,\s*', ', ', cleaned_text)  # normalize to ', '
-        cleaned_text = re.sub(r'(,\s*)+', ', ', cleaned_text)   # collapse multiple commas
-        cleaned_text = cleaned_text.strip(', ').strip()
-        return (lora_stack, cleaned_text)
+        return prompt_to_lora_stack(prompt)
+
+class ErePromptLoraStackBatch(ErePromptLoraStack):
+    # One LoRA stack and filtered prompt per input prompt, in a single call
+    INPUT_IS_LIST = True
+    OUTPUT_IS_LIST = (True, True)
+
+    def process(self, prompt):
+        filenames = {}
+        results = [prompt_to_lora_stack(p, filenames) for p in prompt]
+        return ([stack for stack, _ in results], [text for _, text in results])
 
 NODE_CLASS_MAPPINGS = {
-    "ErePromptLoraStack": ErePromptLoraStack
+    "ErePromptLoraStack": ErePromptLoraStack,
+    "ErePromptLoraStackBatch": ErePromptLoraStackBatch,
 }
 
 NODE_DISPLAY_NAME_MAPPINGS = {
-    "ErePromptLoraStack": "Prompt to LoRA Stack"
+    "ErePromptLoraStack": "Prompt to LoRA Stack",
+    "ErePromptLoraStackBatch": "Prompt to LoRA Stack (Batch)",
 }
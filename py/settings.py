@@ -1,24 +1,106 @@
 import os
 import json
+import time
+import atexit
+import threading
+
+from .atomic_write import write_atomic
 
 SETTINGS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "settings.json")
 
-def get_erenodes_settings():
+# Settings are served from memory. The file is stat'ed at most once per
+# SETTINGS_CHECK_INTERVAL to pick up outside edits, and writes are coalesced
+# into one atomic replace SETTINGS_SAVE_DELAY seconds after the last change.
+SETTINGS_CHECK_INTERVAL = 1.0
+SETTINGS_SAVE_DELAY = 0.5
+
+_settings_lock = threading.Lock()
+_write_lock = threading.Lock()
+_settings = None
+_settings_mtime = None
+_last_check = 0.0
+_dirty = False
+_save_timer = None
+
+def _default_settings():
+    return {'active_csv': None, 'other_settings': {}}
+
+def _settings_file_mtime():
+    try:
+        return os.stat(SETTINGS_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def _read_settings_file():
     if not os.path.exists(SETTINGS_FILE):
         # Return a default structure if the file doesn't exist
-        return {'active_csv': None, 'other_settings': {}}
+        return _default_settings()
     try:
         with open(SETTINGS_FILE, 'r', encoding='utf-8') as f:
             return json.load(f)
     except json.JSONDecodeError:
         # Return default structure if JSON is invalid
-        return {'active_csv': None, 'other_settings': {}}
+        return _default_settings()
     except Exception as e:
-        return {'active_csv': None, 'other_settings': {}}
+        return _default_settings()
+
+def _current_settings():
+    # Caller holds _settings_lock
+    global _settings, _settings_mtime, _last_check
+    now = time.monotonic()
+    if _settings is not None and (_dirty or now - _last_check < SETTINGS_CHECK_INTERVAL):
+        return _settings
+
+    _last_check = now
+    mtime = _settings_file_mtime()
+    if _settings is None or mtime != _settings_mtime:
+        _settings = _read_settings_file()
+        _settings_mtime = mtime
+    return _settings
+
+def get_erenodes_settings():
+    with _settings_lock:
+        return dict(_current_settings())
+
+def _schedule_save():
+    # Caller holds _settings_lock
+    global _dirty, _save_timer
+    _dirty = True
+    if _save_timer is None:
+        _save_timer = threading.Timer(SETTINGS_SAVE_DELAY, flush_erenodes_settings)
+        _save_timer.daemon = True
+        _save_timer.start()
 
 def save_erenodes_settings(data):
-    try:
-        with open(SETTINGS_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=4)
-    except Exception as e:
-        pass
\ No newline at end of file
+    global _settings
+    with _settings_lock:
+        _settings = dict(data)
+        _schedule_save()
+
+def update_erenodes_setting(key, value):
+    # Read-modify-write under the lock, so concurrent updates can't drop each other
+    global _settings
+    with _settings_lock:
+        settings = dict(_current_settings())
+        settings[key] = value
+        _settings = settings
+        _schedule_save()
+
+def flush_erenodes_settings():
+    global _dirty, _save_timer, _settings_mtime
+    with _write_lock:
+        with _settings_lock:
+            _save_timer = None
+            if not _dirty:
+                return
+            data = dict(_settings)
+            _dirty = False
+
+        if not write_atomic(SETTINGS_FILE, lambda f: json.dump(data, f, indent=4), 'w', 'utf-8'):
+            return
+
+        with _settings_lock:
+            _settings_mtime = _settings_file_mtime()
+
+# Pending changes still reach the disk when ComfyUI shuts down inside the save delay
+atexit.register(flush_erenodes_settings)
@@ -0,0 +1,232 @@
+import os
+import json
+import time
+import threading
+
+from .file_index import INDEX_CHECK_INTERVAL
+
+# Parsed tag groups from __prompts__, plus an inverted index from what they
+# contain (tags, LoRAs, embeddings, trigger words, nested groups) to the groups
+# containing it. Groups are loaded on the first search, groups we save are
+# updated right away and changes made outside of ComfyUI are picked up by
+# mtime and size, checked at most every INDEX_CHECK_INTERVAL.
+TERM_KINDS = ("tag", "lora", "embedding", "trigger", "group")
+# Nesting levels followed when expanding group references
+MAX_EXPAND_DEPTH = 8
+
+def normalize_term(kind, value):
+    value = value.strip().lower()
+    if kind in ("tag", "trigger"):
+        # Autocomplete inserts "blue_eyes", people type "blue eyes"
+        return value.replace('_', ' ')
+    if kind == "embedding" and value.startswith("embedding:"):
+        value = value[len("embedding:"):]
+    return value.replace('\\', '/')
+
+def group_terms(tags):
+    # (kind, normalized value) pairs a group can be found by
+    terms = set()
+    if not isinstance(tags, list):
+        return terms
+    for tag in tags:
+        if not isinstance(tag, dict):
+            continue
+        name = tag.get("name")
+        kind = tag.get("type") or "tag"
+        if kind in TERM_KINDS and isinstance(name, str) and name.strip():
+            value = normalize_term(kind, name)
+            terms.add((kind, value))
+            # LoRAs and groups are also found by their name without folders
+            if kind in ("lora", "group") and '/' in value:
+                terms.add((kind, value.rsplit('/', 1)[1]))
+        triggers = tag.get("triggers")
+        if isinstance(triggers, list):
+            for trigger in triggers:
+                if isinstance(trigger, str) and trigger.strip():
+                    terms.add(("trigger", normalize_term("trigger", trigger)))
+    return terms
+
+def group_references(tags):
+    # File names of the groups a group refers to, as the frontend requests them
+    references = []
+    if isinstance(tags, list):
+        for tag in tags:
+            if isinstance(tag, dict) and tag.get("type") == "group" and isinstance(tag.get("name"), str) and tag["name"]:
+                extension = tag.get("extension")
+                references.append(tag["name"] + extension if isinstance(extension, str) else tag["name"])
+    return references
+
+def _read_group(path):
+    stat = os.stat(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return (stat.st_mtime_ns, stat.st_size), data
+
+class TagGroupStore:
+    def __init__(self, root, files):
+        self.root = os.path.abspath(root)
+        # FileIndex listing the group folders, see file_index.py
+        self.files = files
+        # relative path -> ((mtime_ns, size), parsed tags or None if invalid, terms)
+        self.groups = {}
+        # term -> set of relative paths
+        self.index = {}
+        self.synced = None
+        self.lock = threading.Lock()
+        # One sync at a time, files are read without holding self.lock
+        self.sync_lock = threading.Lock()
+
+    def relative(self, path):
+        return os.path.relpath(os.path.abspath(path), self.root)
+
+    def _set(self, rel, key, data):
+        self._drop(rel)
+        terms = group_terms(data)
+        self.groups[rel] = (key, data, terms)
+        for term in terms:
+            self.index.setdefault(term, set()).add(rel)
+
+    def _drop(self, rel):
+        entry = self.groups.pop(rel, None)
+        if entry is None:
+            return
+        for term in entry[2]:
+            paths = self.index.get(term)
+            if paths is not None:
+                paths.discard(rel)
+                if not paths:
+                    del self.index[term]
+
+    def get(self, path):
+        # Parsed JSON of a group file, re-read only when its mtime or size moved.
+        # Raises OSError or json.JSONDecodeError like reading the file would.
+        rel = self.relative(path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            entry = self.groups.get(rel)
+            if entry is not None and entry[0] == key and entry[1] is not None:
+                return entry[1]
+
+        key, data = _read_group(path)
+        if path.lower().endswith(".json"):
+            with self.lock:
+                self._set(rel, key, data)
+        return data
+
+    def update(self, path):
+        # Index a group we just wrote
+        try:
+            key, data = _read_group(path)
+        except (OSError, ValueError):
+            return
+        with self.lock:
+            self._set(self.relative(path), key, data)
+
+    def sync(self, force=False):
+        with self.sync_lock:
+            now = time.time()
+            if not force and self.synced is not None and now - self.synced < INDEX_CHECK_INTERVAL:
+                return
+            self.synced = now
+            self.files.refresh(force)
+
+            with self.lock:
+                known = {rel: entry[0] for rel, entry in self.groups.items()}
+            seen = set()
+            changed = []
+            for dirpath, listing in self.files.walk(self.root):
+                for name, ext, _ in listing.files:
+                    path = os.path.join(dirpath, name + ext)
+                    rel = self.relative(path)
+                    seen.add(rel)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    key = (stat.st_mtime_ns, stat.st_size)
+                    if known.get(rel) == key:
+                        continue
+                    try:
+                        key, data = _read_group(path)
+                    except (OSError, ValueError):
+                        # Kept with its key so a broken file isn't re-read every sync
+                        data = None
+                    changed.append((rel, key, data))
+
+            with self.lock:
+                for rel, key, data in changed:
+                    self._set(rel, key, data)
+                for rel in known.keys() - seen:
+                    self._drop(rel)
+
+    def expand(self, filenames, resolve, max_depth=0):
+        # Groups by file name, with those they refer to up to max_depth levels
+        # down. `resolve` maps a file name to its path, None if it isn't allowed.
+        # Each group is loaded once however often it's referenced, reference
+        # loops are reported in "cycles" and groups whose references were cut
+        # off by the depth limit in "truncated".
+        groups = {}
+        missing = []
+        cycles = []
+        budgets = {}
+
+        def load(name):
+            if name not in groups:
+                path = resolve(name)
+                try:
+                    groups[name] = self.get(path) if path is not None else None
+                except (OSError, ValueError):
+                    groups[name] = None
+                if groups[name] is None:
+                    missing.append(name)
+            return groups[name]
+
+        def visit(name, budget, chain):
+            if name in chain:
+                cycle = chain[chain.index(name):] + [name]
+                if cycle not in cycles:
+                    cycles.append(cycle)
+                return
+            # Already expanded at least this deep
+            if budgets.get(name, -1) >= budget:
+                return
+            budgets[name] = budget
+            tags = load(name)
+            if budget == 0 or tags is None:
+                return
+            chain.append(name)
+            for reference in group_references(tags):
+                visit(reference, budget - 1, chain)
+            chain.pop()
+
+        for name in filenames:
+            visit(name, max_depth, [])
+
+        truncated = [name for name, budget in budgets.items()
+                     if budget == 0 and max_depth > 0 and group_references(groups[name])]
+        return {
+            "groups": {name: tags for name, tags in groups.items() if tags is not None},
+            "missing": missing,
+            "cycles": cycles,
+            "truncated": truncated,
+        }
+
+    def rescan(self):
+        with self.sync_lock:
+            self.synced = None
+
+    def search(self, query, kinds=TERM_KINDS, contains=False):
+        # relative path -> matching terms, for the groups containing `query`
+        self.sync()
+        with self.lock:
+            if contains:
+                needles = {kind: normalize_term(kind, query) for kind in kinds}
+                terms = [term for term in self.index if term[0] in needles and needles[term[0]] in term[1]]
+            else:
+                terms = [(kind, normalize_term(kind, query)) for kind in kinds]
+            matches = {}
+            for term in terms:
+                for rel in self.index.get(term, ()):
+                    matches.setdefault(rel, []).append(term)
+        return matches
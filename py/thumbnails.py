@@ -0,0 +1,68 @@
+import io
+import os
+import hashlib
+
+try:
+    from PIL import Image, features
+except ImportError:
+    Image = None
+
+from .atomic_write import write_atomic
+
+# Downscaled previews for the gallery and the context menu. A thumbnail is
+# generated once per source image and size, then served from __cache__/thumbnails.
+# The cache file name hashes the source path, size and thumbnail size, and its
+# mtime is set to the source's, so a replaced preview image is regenerated.
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+THUMBNAIL_CACHE_DIR = os.path.join(project_root, "__cache__", "thumbnails")
+# Requested sizes are rounded up to one of these, to bound the number of variants
+THUMBNAIL_SIZES = (64, 128, 256, 512, 1024)
+THUMBNAIL_QUALITY = 85
+
+def thumbnail_size(requested):
+    for size in THUMBNAIL_SIZES:
+        if requested <= size:
+            return size
+    return THUMBNAIL_SIZES[-1]
+
+def thumbnail_format():
+    if Image is None:
+        return None
+    return ("WEBP", "image/webp") if features.check("webp") else ("JPEG", "image/jpeg")
+
+def thumbnail_etag(source_stat, size):
+    return f'"{source_stat.st_mtime_ns:x}-{source_stat.st_size:x}-{size}"'
+
+def _render(image_path, size, image_format):
+    with Image.open(image_path) as image:
+        image.draft("RGB", (size, size))
+        image.thumbnail((size, size), Image.LANCZOS)
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        mode = "RGBA" if has_alpha and image_format == "WEBP" else "RGB"
+        if image.mode != mode:
+            image = image.convert(mode)
+        out = io.BytesIO()
+        image.save(out, image_format, quality=THUMBNAIL_QUALITY)
+    return out.getvalue()
+
+def get_thumbnail(image_path, size, source_stat):
+    # Thumbnail bytes and content type, or None when Pillow isn't available
+    thumb_format = thumbnail_format()
+    if thumb_format is None:
+        return None
+    image_format, content_type = thumb_format
+
+    key = f"{os.path.abspath(image_path)}|{source_stat.st_size}|{size}|{image_format}"
+    cache_file = os.path.join(THUMBNAIL_CACHE_DIR, hashlib.sha1(key.encode('utf-8', 'surrogateescape')).hexdigest())
+    try:
+        if os.stat(cache_file).st_mtime_ns == source_stat.st_mtime_ns:
+            with open(cache_file, 'rb') as f:
+                return f.read(), content_type
+    except OSError:
+        pass
+
+    data = _render(image_path, size, image_format)
+
+    # Served from the fresh bytes even when the cache folder isn't writable
+    write_atomic(cache_file, lambda f: f.write(data), mtime_ns=source_stat.st_mtime_ns)
+    return data, content_type
@@ -0,0 +1,43 @@
+import os
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Blocking work (tag search, directory scans, safetensors reads) runs on this
+# pool instead of the PromptServer event loop, which also has to keep
+# ComfyUI's websocket progress and queue handling responsive.
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+EXECUTOR = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="erenodes")
+
+# Newest request generation per client channel (one per open menu)
+MAX_CHANNELS = 1024
+_channels = OrderedDict()
+_channels_lock = threading.Lock()
+
+class Superseded(Exception):
+    pass
+
+def supersede(channel):
+    # Register a new request on `channel`. The returned check turns true as soon
+    # as a newer request arrives on the same channel, e.g. the next keystroke.
+    if not channel:
+        return lambda: False
+
+    with _channels_lock:
+        generation = _channels.get(channel, 0) + 1
+        _channels[channel] = generation
+        _channels.move_to_end(channel)
+        while len(_channels) > MAX_CHANNELS:
+            _channels.popitem(last=False)
+
+    return lambda: _channels.get(channel) != generation
+
+async def run_blocking(func, *args, cancelled=None):
+    # Jobs that were superseded while waiting in the queue never start
+    def job():
+        if cancelled is not None and cancelled():
+            raise Superseded()
+        return func(*args)
+
+    return await asyncio.get_running_loop().run_in_executor(EXECUTOR, job)
@@ -0,0 +1,30 @@
+import time
+
+from conftest import load_package
+from test_prompt_filter import old_prompt_tokens, prompt_tokens, realistic_prompts
+
+# Tokenizing 200-tag prompts with the old regex chain and with clean_token().
+# Run with `python tests/bench_prompt_filter.py`.
+ROUNDS = 5
+
+def best_time(func, prompts):
+    best = None
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        for prompt in prompts:
+            func(prompt)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(prompts)
+
+def main():
+    prompt_filter = load_package().py.prompt_filter
+    prompts = realistic_prompts()
+    old = best_time(old_prompt_tokens, prompts)
+    new = best_time(lambda prompt: prompt_tokens(prompt_filter, prompt), prompts)
+    print(f"{len(prompts)} prompts of 200 tags, best of {ROUNDS}")
+    print(f"old regex chain: {old * 1e6:8.0f} us/prompt")
+    print(f"clean_token:     {new * 1e6:8.0f} us/prompt ({old / new:.1f}x)")
+
+if __name__ == "__main__":
+    main()
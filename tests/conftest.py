@@ -0,0 +1,73 @@
+import os
+import sys
+import types
+import importlib.util
+
+import pytest
+from aiohttp import web
+
+# The extension imports ComfyUI's `server` and `folder_paths`. Tests run
+# without ComfyUI, so both are replaced by minimal stand-ins before the
+# package is loaded under the name "erenodes".
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# model type -> list of root directories, set by tests through `model_roots`
+MODEL_ROOTS = {}
+
+def _install_stubs():
+    server = types.ModuleType("server")
+
+    class PromptServer:
+        instance = types.SimpleNamespace(routes=web.RouteTableDef())
+
+    server.PromptServer = PromptServer
+
+    folder_paths = types.ModuleType("folder_paths")
+    # extra_model_paths.yaml is looked up next to this file, there is none
+    folder_paths.__file__ = os.path.join(REPO_ROOT, "tests", "folder_paths.py")
+
+    def get_folder_paths(model_type):
+        return list(MODEL_ROOTS.get(model_type, []))
+
+    def get_full_path(model_type, filename):
+        for root in get_folder_paths(model_type):
+            path = os.path.join(root, filename)
+            if os.path.isfile(path):
+                return path
+        return None
+
+    folder_paths.get_folder_paths = get_folder_paths
+    folder_paths.get_full_path = get_full_path
+
+    sys.modules.setdefault("server", server)
+    sys.modules.setdefault("folder_paths", folder_paths)
+
+_install_stubs()
+
+def load_package():
+    # pytest imports the repo root itself when it collects it as a package
+    init_path = os.path.join(REPO_ROOT, "__init__.py")
+    for module in list(sys.modules.values()):
+        if getattr(module, "__file__", None) == init_path:
+            return module
+    spec = importlib.util.spec_from_file_location("erenodes", init_path, submodule_search_locations=[REPO_ROOT])
+    package = importlib.util.module_from_spec(spec)
+    sys.modules["erenodes"] = package
+    spec.loader.exec_module(package)
+    return package
+
+@pytest.fixture(scope="session")
+def erenodes():
+    return load_package()
+
+@pytest.fixture
+def app(erenodes):
+    application = web.Application()
+    application.add_routes(sys.modules["server"].PromptServer.instance.routes)
+    return application
+
+@pytest.fixture
+def model_roots(erenodes):
+    MODEL_ROOTS.clear()
+    yield MODEL_ROOTS
+    MODEL_ROOTS.clear()
+    erenodes.py.prompt_api.refresh_model_paths()
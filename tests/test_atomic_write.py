@@ -0,0 +1,21 @@
+import os
+
+def test_write_atomic_replaces_the_file_and_cleans_up(erenodes, tmp_path):
+    write_atomic = erenodes.py.atomic_write.write_atomic
+    path = tmp_path / "cache" / "entry.json"
+
+    assert write_atomic(str(path), lambda f: f.write("{}"), 'w', 'utf-8', mtime_ns=1_000_000_000)
+    assert path.read_text(encoding="utf-8") == "{}"
+    assert os.stat(path).st_mtime_ns == 1_000_000_000
+
+    # A file where the folder should be stands in for a read-only install
+    blocked = tmp_path / "blocked"
+    blocked.write_bytes(b"")
+    assert not write_atomic(str(blocked / "entry.json"), lambda f: f.write(b"x"))
+
+    def fail(f):
+        f.write(b"partial")
+        raise OSError("disk full")
+    assert not write_atomic(str(path), fail)
+    assert path.read_text(encoding="utf-8") == "{}"
+    assert sorted(os.listdir(path.parent)) == ["entry.json"]
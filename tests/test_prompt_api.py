@@ -0,0 +1,14 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+def test_lora_metadata_bulk_rejects_malformed_bodies(app, model_roots):
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            statuses = []
+            for body in ([1, 2], "lora", {"files": "a.safetensors"}, {"files": []}):
+                response = await client.post("/erenodes/get_lora_metadata_bulk", json=body)
+                statuses.append(response.status)
+        return statuses
+
+    assert asyncio.run(run()) == [400, 400, 400, 200]
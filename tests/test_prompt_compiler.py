@@ -0,0 +1,74 @@
+import json
+from collections import OrderedDict
+
+import pytest
+
+def _write_group(root, name, tags):
+    (root / name).write_text(json.dumps(tags), encoding="utf-8")
+
+def _tag(name):
+    return {"name": name, "active": True}
+
+def _group(name):
+    return {"name": name, "extension": ".json", "type": "group", "active": True}
+
+@pytest.fixture
+def compiler(erenodes, tmp_path, monkeypatch):
+    prompt_compiler = erenodes.py.prompt_compiler
+    groups = erenodes.py.tag_groups.TagGroupStore(str(tmp_path), erenodes.py.file_index.FileIndex((".json",)))
+    monkeypatch.setattr(erenodes.py.prompt_api, "prompts_dir", str(tmp_path))
+    monkeypatch.setattr(prompt_compiler, "TAG_GROUPS", groups)
+    monkeypatch.setattr(prompt_compiler, "_compile_cache", OrderedDict())
+    monkeypatch.setattr(prompt_compiler, "_node_prompts", {})
+    return prompt_compiler
+
+def _queue(node_class, prompt, unique_id="1"):
+    # What ComfyUI does for a queued prompt: compare IS_CHANGED with the last
+    # run and only run the node when it moved
+    return node_class.IS_CHANGED(unique_id=unique_id), node_class().process(prompt, unique_id=unique_id)[0]
+
+def test_is_changed_follows_the_groups_a_prompt_reads(compiler, tmp_path):
+    node_class = compiler.ErePromptCompiler
+    prompt = "smile, group:a.json"
+    _write_group(tmp_path, "a.json", [_tag("blue eyes")])
+    _write_group(tmp_path, "other.json", [_tag("hat")])
+
+    _, compiled = _queue(node_class, prompt)
+    assert compiled == "smile, blue eyes"
+    first = node_class.IS_CHANGED(unique_id="1")
+    assert node_class.IS_CHANGED(unique_id="1") == first
+
+    # Groups the prompt doesn't read don't rerun the node
+    _write_group(tmp_path, "other.json", [_tag("red hat")])
+    assert node_class.IS_CHANGED(unique_id="1") == first
+
+    _write_group(tmp_path, "a.json", [_tag("green eyes")])
+    edited = node_class.IS_CHANGED(unique_id="1")
+    assert edited != first
+    assert node_class().process(prompt, unique_id="1")[0] == "smile, green eyes"
+
+def test_is_changed_sees_a_referenced_group_being_created(compiler, tmp_path):
+    node_class = compiler.ErePromptCompiler
+    prompt = "smile, group:new.json"
+
+    _, compiled = _queue(node_class, prompt)
+    assert compiled == "smile"
+    missing = node_class.IS_CHANGED(unique_id="1")
+
+    _write_group(tmp_path, "new.json", [_tag("red")])
+    assert node_class.IS_CHANGED(unique_id="1") != missing
+    assert node_class().process(prompt, unique_id="1")[0] == "smile, red"
+
+def test_is_changed_follows_nested_groups_through_a_cycle(compiler, tmp_path):
+    node_class = compiler.ErePromptCompiler
+    prompt = "group:a.json"
+    _write_group(tmp_path, "a.json", [_tag("smile"), _group("b")])
+    _write_group(tmp_path, "b.json", [_tag("hat"), _group("a")])
+
+    _, compiled = _queue(node_class, prompt)
+    assert compiled == "smile, hat"
+    first = node_class.IS_CHANGED(unique_id="1")
+
+    _write_group(tmp_path, "b.json", [_tag("red hat"), _group("a")])
+    assert node_class.IS_CHANGED(unique_id="1") != first
+    assert node_class().process(prompt, unique_id="1")[0] == "smile, red hat"
@@ -0,0 +1,113 @@
+import asyncio
+
+from aiohttp.test_utils import TestClient, TestServer
+
+def test_search_tags_batch_rejects_malformed_bodies(erenodes, app, tmp_path, monkeypatch):
+    prompt_csv = erenodes.py.prompt_csv
+    csv_path = tmp_path / "tags.csv"
+    csv_path.write_text('blue_eyes,0,100,""\nblue_hair,0,50,""\n', encoding="utf-8")
+    index = prompt_csv.TagIndex.build(prompt_csv.load_tags_from_csv(str(csv_path)))
+    monkeypatch.setattr(prompt_csv, "get_ready_tag_index", lambda: index)
+
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            statuses = []
+            for body in ([1, 2], "blue", {"queries": ["blue"], "limit": "many"}, {"queries": ["blue"], "distance": None}):
+                response = await client.post("/erenodes/search_tags_batch", json=body)
+                statuses.append(response.status)
+            response = await client.post("/erenodes/search_tags_batch", json={"queries": ["blue"], "limit": "3"})
+            statuses.append(response.status)
+        return statuses
+
+    assert asyncio.run(run()) == [400, 400, 400, 400, 200]
+
+def test_batch_lookup_and_prompt_filter_resolve_aliases_alike(erenodes, tmp_path):
+    prompt_csv = erenodes.py.prompt_csv
+    filter_prompt = erenodes.py.prompt_filter.filter_prompt
+    csv_path = tmp_path / "tags.csv"
+    csv_path.write_text(
+        'thighhighs,0,500,"thighhigh"\n'
+        'single_thighhigh,0,50,"thighhigh"\n'
+        'tail,0,400,"tails"\n'
+        'tails,0,10,""\n'
+        'multiple_tails,0,40,"tails"\n'
+        'smile,0,900,""\n', encoding="utf-8")
+    index = prompt_csv.TagIndex.build(prompt_csv.load_tags_from_csv(str(csv_path)))
+
+    results = prompt_csv.resolve_batch(index, ["thighhigh", "tails", "smile", "unknown"], "rank", 0)
+    canonical = {result["query"]: (result["canonical"], result["alias"]) for result in results}
+    # The last row listing an alias wins, even over a tag of that name
+    assert canonical == {
+        "thighhigh": ("single thighhigh", True),
+        "tails": ("multiple tails", True),
+        "smile": ("smile", False),
+        "unknown": (None, False),
+    }
+    for query, (main, _) in canonical.items():
+        assert filter_prompt(query, index, "Use main") == (main or "")
+
+def test_search_tags_rejects_non_numeric_parameters(erenodes, app, tmp_path, monkeypatch):
+    prompt_csv = erenodes.py.prompt_csv
+    csv_path = tmp_path / "tags.csv"
+    csv_path.write_text('blue_eyes,0,100,""\n', encoding="utf-8")
+    index = prompt_csv.TagIndex.build(prompt_csv.load_tags_from_csv(str(csv_path)))
+    monkeypatch.setattr(prompt_csv, "get_ready_tag_index", lambda: index)
+
+    async def run():
+        async with TestClient(TestServer(app)) as client:
+            statuses = []
+            for params in ({"distance": "x"}, {"limit": "ten"}, {"limit": "3", "distance": "1"}):
+                response = await client.get("/erenodes/search_tags", params={"query": "blue", "mode": "fuzzy", **params})
+                statuses.append(response.status)
+        return statuses
+
+    assert asyncio.run(run()) == [400, 400, 200]
+
+def test_damaged_compiled_index_is_rebuilt_from_the_csv(erenodes, tmp_path):
+    prompt_csv = erenodes.py.prompt_csv
+    csv_path = tmp_path / "tags.csv"
+    csv_path.write_text('blue_eyes,0,100,"blue eye"\nblue_hair,0,50,""\n', encoding="utf-8")
+    compiled_path = str(csv_path) + prompt_csv.COMPILED_SUFFIX
+    prompt_csv.load_tag_index(str(csv_path))
+
+    # Give the "counts" section a size that isn't a whole number of items
+    sections = prompt_csv.STORE_SECTIONS + prompt_csv.INDEX_SECTIONS
+    data = bytearray(open(compiled_path, 'rb').read())
+    table_start = len(data) - prompt_csv.COMPILED_FOOTER.size - len(sections) * prompt_csv.COMPILED_SECTION.size
+    entry = table_start + [name for name, _ in sections].index("counts") * prompt_csv.COMPILED_SECTION.size
+    offset, size = prompt_csv.COMPILED_SECTION.unpack_from(data, entry)
+    prompt_csv.COMPILED_SECTION.pack_into(data, entry, offset, size - 1)
+    with open(compiled_path, 'wb') as f:
+        f.write(data)
+
+    assert prompt_csv.load_compiled_index(compiled_path, csv_path.stat()) is None
+    index = prompt_csv.load_tag_index(str(csv_path))
+    assert index.resolve("blue eye") == (None, 0)
+    assert prompt_csv.load_compiled_index(compiled_path, csv_path.stat()) is not None
+
+def test_failed_dictionary_is_not_rewarmed_on_every_search(erenodes, tmp_path, monkeypatch):
+    prompt_csv = erenodes.py.prompt_csv
+    csv_path = tmp_path / "tags.csv"
+    csv_path.write_text('blue_eyes,0,100,""\n', encoding="utf-8")
+    monkeypatch.setattr(prompt_csv, "CSV_FILES_PATH", str(tmp_path))
+    monkeypatch.setattr(prompt_csv, "get_active_csv", lambda: "tags.csv")
+    monkeypatch.setattr(prompt_csv, "TAG_LOAD_STATUS", {})
+    monkeypatch.setattr(prompt_csv, "TAG_DATA_CACHE", type(prompt_csv.TAG_DATA_CACHE)())
+
+    loads = []
+    def broken_load(path):
+        loads.append(path)
+        raise ValueError("broken dictionary")
+    monkeypatch.setattr(prompt_csv, "load_tag_index", broken_load)
+    # Warm on the calling thread so every attempt has finished when it returns
+    monkeypatch.setattr(prompt_csv, "warm_tag_index", lambda active_csv=None: prompt_csv.get_tag_index(active_csv))
+
+    for _ in range(5):
+        assert prompt_csv.get_ready_tag_index() is None
+    assert len(loads) == 1
+    assert prompt_csv.TAG_LOAD_STATUS["tags.csv"]["state"] == "failed"
+
+    # Editing the CSV is worth another attempt
+    csv_path.write_text('blue_eyes,0,100,""\nblue_hair,0,50,""\n', encoding="utf-8")
+    prompt_csv.get_ready_tag_index()
+    assert len(loads) == 2
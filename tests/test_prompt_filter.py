@@ -0,0 +1,88 @@
+import os
+import re
+import random
+
+from conftest import REPO_ROOT
+
+# The Prompt Filter's token cleaning as it was before clean_token(), kept as
+# the reference its output has to match
+def old_clean_token(token):
+    token = re.sub(r'<lora:[^:>]+(:[^:>]+){1,2}>', '', token)
+    token = re.sub(r'lora\([^)]+\)', '', token)
+    token = re.sub(r'<[^>]+>', '', token)
+    token = re.sub(r'([\w\- ]+):[\d.]+', r'\1', token)
+
+    token = re.sub(r'^\(\(\((.*?)\)\)\)$', r'\1', token)
+    token = re.sub(r'^\(\((.*?)\)\)$', r'\1', token)
+    token = re.sub(r'^\(([^\(\)]+:[\d.]+)\)$', r'\1', token)
+    token = re.sub(r'^\[([^\[\]]+:[\d.]+)\]$', r'\1', token)
+    token = re.sub(r'^\{([^{}]+:[\d.]+)\}$', r'\1', token)
+    token = re.sub(r'^[\(\[\{](.*?)[\)\]\}]$', r'\1', token)
+
+    token = token.replace(r'\(', '(').replace(r'\)', ')').strip()
+    return token
+
+def old_prompt_tokens(prompt):
+    return [old_clean_token(t.strip()) for t in re.split(r'[,\n]', prompt) if t.strip()]
+
+def realistic_prompts(count=200, size=200, seed=3):
+    # Prompts of `size` danbooru tags with the usual weights, emphasis,
+    # LoRA tags and escaped parentheses mixed in
+    with open(os.path.join(REPO_ROOT, "__autocomplete__", "danbooru.csv"), encoding="utf-8") as f:
+        names = [line.split(',', 1)[0].replace('_', ' ') for _, line in zip(range(5000), f)]
+    rng = random.Random(seed)
+
+    def token():
+        name = rng.choice(names)
+        roll = rng.random()
+        if roll < 0.15:
+            return f"({name}:{rng.uniform(0.5, 1.5):.1f})"
+        if roll < 0.22:
+            return f"(({name}))"
+        if roll < 0.25:
+            return f"[{name}]"
+        if roll < 0.28:
+            return f"<lora:{name.replace(' ', '')}:0.8>"
+        if roll < 0.30:
+            return name.replace('(', '\\(').replace(')', '\\)')
+        return name
+
+    return [', '.join(token() for _ in range(size)) for _ in range(count)]
+
+def prompt_tokens(prompt_filter, prompt):
+    tokens = (t.strip() for t in prompt_filter.TOKEN_SPLIT.split(prompt))
+    return [prompt_filter.clean_token(t) for t in tokens if t]
+
+def test_clean_token_known_cases(erenodes):
+    clean_token = erenodes.py.prompt_filter.clean_token
+    cases = {
+        "blue eyes": "blue eyes",
+        "(blue eyes:1.2)": "blue eyes",
+        "((blue eyes:1.2))": "blue eyes",
+        "(((blue eyes:1.1)))": "blue eyes",
+        "[blue eyes:0.8]": "blue eyes",
+        "{blue eyes}": "blue eyes",
+        "((smile))": "smile",
+        "hatsune miku \\(cosplay\\)": "hatsune miku (cosplay)",
+        "<lora:detail:0.8>": "",
+        "<lora:detail:0.8:0.5> smile": "smile",
+        "lora(detail) smile": "smile",
+        "a:1:2": "a:2",
+    }
+    for token, expected in cases.items():
+        assert clean_token(token) == expected == old_clean_token(token), token
+
+def test_clean_token_matches_old_chain_on_random_tokens(erenodes):
+    clean_token = erenodes.py.prompt_filter.clean_token
+    pieces = ['a', 'b', 'é', '٣', '1', '2', '.', ':', ' ', '-', '(', ')', '[', ']', '{', '}',
+              '\\', '<', '>', 'lora', 'lora(', '<lora:', '!', '^', '\t', '²', '_']
+    rng = random.Random(0)
+    for _ in range(20000):
+        token = ''.join(rng.choice(pieces) for _ in range(rng.randint(1, 24))).strip()
+        if token:
+            assert clean_token(token) == old_clean_token(token), token
+
+def test_clean_token_matches_old_chain_on_realistic_prompts(erenodes):
+    prompt_filter = erenodes.py.prompt_filter
+    for prompt in realistic_prompts(count=20):
+        assert prompt_tokens(prompt_filter, prompt) == old_prompt_tokens(prompt)
@@ -0,0 +1,75 @@
+import asyncio
+import statistics
+
+from aiohttp.test_utils import TestClient, TestServer
+
+# Lag is how much later than asked an asyncio.sleep(TICK) wakes up, i.e. how
+# long the event loop was kept from ComfyUI's websocket and queue handlers
+TICK = 0.005
+SEARCHES = 120
+
+def _write_dictionary(path, size):
+    words = ["hair", "eyes", "dress", "smile", "shirt", "skirt", "ribbon", "sky", "tail", "bow"]
+    colors = ["red", "blue", "green", "black", "white", "pink", "silver", "orange"]
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(size):
+            name = f"{colors[i % len(colors)]}_{words[(i // len(colors)) % len(words)]}_{i}"
+            f.write(f'{name},0,{size - i},"{name}_alias"\n')
+
+def _write_lora_tree(root, folders, files):
+    for d in range(folders):
+        folder = root / f"folder_{d}"
+        folder.mkdir(parents=True)
+        for n in range(files):
+            (folder / f"lora_{d}_{n}.safetensors").write_bytes(b"")
+
+def test_event_loop_latency_stays_flat_under_concurrent_searches(erenodes, app, model_roots, tmp_path, monkeypatch):
+    prompt_csv = erenodes.py.prompt_csv
+    csv_path = tmp_path / "tags.csv"
+    _write_dictionary(csv_path, 20000)
+    index = prompt_csv.TagIndex.build(prompt_csv.load_tags_from_csv(str(csv_path)))
+    monkeypatch.setattr(prompt_csv, "get_ready_tag_index", lambda: index)
+
+    _write_lora_tree(tmp_path / "loras", 20, 50)
+    model_roots["loras"] = [str(tmp_path / "loras")]
+    erenodes.py.prompt_api.refresh_model_paths()
+    erenodes.py.prompt_api.FILE_INDEXES["lora"].rescan()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        lags = []
+        stop = asyncio.Event()
+
+        async def ticker():
+            while not stop.is_set():
+                started = loop.time()
+                await asyncio.sleep(TICK)
+                lags.append(loop.time() - started - TICK)
+
+        async with TestClient(TestServer(app)) as client:
+            async def search(i):
+                if i % 3 == 2:
+                    response = await client.get("/erenodes/search_files", params={"type": "lora", "query": f"lora_{i % 20}"})
+                else:
+                    # The first fuzzy query also builds the fuzzy index
+                    mode = "fuzzy" if i % 3 else "rank"
+                    response = await client.get("/erenodes/search_tags", params={"query": f"blue hiar {i}", "mode": mode, "limit": "10"})
+                await response.read()
+                return response.status
+
+            task = asyncio.create_task(ticker())
+            await asyncio.sleep(0.1)
+            baseline = list(lags)
+            statuses = await asyncio.gather(*(search(i) for i in range(SEARCHES)))
+            stop.set()
+            await task
+        return baseline, lags[len(baseline):], statuses
+
+    baseline, loaded, statuses = asyncio.run(run())
+
+    assert statuses == [200] * SEARCHES
+    assert loaded, "the ticker never ran while searches were in flight"
+    # Inline on the loop, each search would hold it for its whole duration
+    # and building the fuzzy index alone takes far longer than these bounds
+    assert statistics.median(loaded) < statistics.median(baseline) + 0.02
+    assert max(loaded) < 0.25
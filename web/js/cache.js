@@ -101,4 +101,97 @@ export function clearCache(url) {
             cache.delete(key);
         }
     }
-}
\ No newline at end of file
+}
+// Thumbnail sizes requested from /erenodes/view, the server rounds them up to its own steps
+export const PREVIEW_SIZES = { gallery: 256, menu: 512 };
+
+/**
+ * Builds the URL of a tag's preview image, downscaled on the server.
+ * @param {string} type The tag type (lora, embedding, group).
+ * @param {string} path The file path without extension.
+ * @param {number} size The thumbnail size in pixels.
+ */
+export function previewUrl(type, path, size) {
+    return `/erenodes/view/${type}/${path}?thumb=${size}`;
+}
+
+/**
+ * Splits a file path without extension into its folder and file name.
+ * @param {string} path The file path, with '/' or '\\' separators.
+ */
+export function splitPreviewPath(path) {
+    const slash = Math.max(path.lastIndexOf('\\'), path.lastIndexOf('/'));
+    return slash === -1 ? { folder: '', name: path } : { folder: path.substring(0, slash), name: path.substring(slash + 1) };
+}
+
+function previewListingBase(type, folder) {
+    return `/erenodes/search_files?type=${type}&path=${encodeURIComponent(folder)}&details=preview`;
+}
+
+/**
+ * Builds the URL of a listing that tells, for just the named files of a folder,
+ * whether each has a preview image.
+ * @param {string} type The tag type (lora, embedding, group).
+ * @param {string} folder The folder, as returned by splitPreviewPath.
+ * @param {Iterable<string>} names The file names without extension.
+ */
+export function previewListingUrl(type, folder, names) {
+    const query = [...names].sort().map(name => `&name=${encodeURIComponent(name)}`).join('');
+    return previewListingBase(type, folder) + query;
+}
+
+/**
+ * Drops a replaced preview image from this cache and from the browser's HTTP cache.
+ * Thumbnails are served with a long max-age, so they are re-fetched with cache: 'reload'.
+ * @param {string} type The tag type.
+ * @param {string} path The file path without extension.
+ */
+export async function reloadPreview(type, path) {
+    const listings = `json:${previewListingBase(type, splitPreviewPath(path).folder)}&`;
+    for (const key of [...cache.keys()]) {
+        if (key.startsWith(listings)) cache.delete(key);
+    }
+    for (const size of Object.values(PREVIEW_SIZES)) {
+        const url = previewUrl(type, path, size);
+        clearCache(url);
+        try {
+            await fetch(url, { cache: 'reload' });
+        } catch (error) {
+            // Nothing cached to replace
+        }
+    }
+}
+
+/**
+ * Builds the URL a tag group's contents are fetched and cached under.
+ * @param {string} filename The group file name relative to __prompts__, with extension.
+ */
+export function tagGroupUrl(filename) {
+    return `/erenodes/get_tag_group?filename=${encodeURIComponent(filename)}`;
+}
+
+/**
+ * Loads the tag groups that aren't cached yet in one request, together with the groups
+ * they refer to, and caches each under its tagGroupUrl.
+ * @param {string[]} filenames The group file names, with extension.
+ */
+export async function prefetchTagGroups(filenames) {
+    const missing = [...new Set(filenames)].filter(filename => !cache.has(`json:${tagGroupUrl(filename)}`));
+    if (missing.length === 0) return;
+    try {
+        const response = await fetch('/erenodes/get_tag_groups_bulk', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ paths: missing, expand: true }),
+        });
+        if (!response.ok) return;
+        const { groups } = await response.json();
+        for (const [filename, tags] of Object.entries(groups)) {
+            const cacheKey = `json:${tagGroupUrl(filename)}`;
+            // Don't replace a copy fetched in the meantime
+            if (!cache.has(cacheKey)) cache.set(cacheKey, tags);
+        }
+    } catch (error) {
+        // The groups are fetched one by one instead
+    }
+}
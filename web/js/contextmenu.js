@@ -1,5 +1,5 @@
 import { app } from "../../../../scripts/app.js";
-import { getCache, clearCache } from "./cache.js";
+import { getCache, previewUrl, reloadPreview, PREVIEW_SIZES } from "./cache.js";
 
 // Base class for dynamic context menus
 export class DynamicContextMenu { // Added export
@@ -245,7 +245,7 @@ export class DynamicContextMenu { // Added export
             const option = this.options[index];
             if (option && !option.disabled && this.showPreview &&
                 ['file', 'lora', 'embedding', 'group'].includes(option.type)) {
-                this.showPreview(`/erenodes/view/${option.type}/${option.path}`);
+                this.showPreview(previewUrl(option.type, option.path, PREVIEW_SIZES.menu));
             }
         } else {
             // Hide preview when no item is highlighted if hidePreview method exists
@@ -402,8 +402,8 @@ export class DynamicContextMenu { // Added export
                             
                             // Clear image cache and update preview (only for TagEditContextMenu)
                             if (this.tag) {
-                                clearCache(`/erenodes/view/${this.tag.type}/${this.tag.name}`);
-                                this.showPreview(`/erenodes/view/${this.tag.type}/${this.tag.name}`);
+                                await reloadPreview(this.tag.type, this.tag.name);
+                                this.showPreview(previewUrl(this.tag.type, this.tag.name, PREVIEW_SIZES.menu));
                             }
                             
                             // Call imageCallback if it exists
@@ -459,8 +459,9 @@ export class FileContextMenu extends DynamicContextMenu {
     }
 
     async searchFiles(path = "", query = "") {
+        this.searchChannel ??= Math.random().toString(36).slice(2);
         try {
-            const url = `/erenodes/search_files?type=${this.type}&path=${encodeURIComponent(path)}&query=${encodeURIComponent(query)}`;
+            const url = `/erenodes/search_files?type=${this.type}&path=${encodeURIComponent(path)}&query=${encodeURIComponent(query)}&channel=${this.searchChannel}`;
             const response = await fetch(url);
             if (!response.ok) {
                 throw new Error(`HTTP error! status: ${response.status}`);
@@ -501,6 +502,8 @@ export class FileContextMenu extends DynamicContextMenu {
         this.currentPath = path;
         this.currentWord = query;
         const data = await this.searchFiles(path, query);
+        // A newer keystroke already replaced this search
+        if (this.currentPath !== path || this.currentWord !== query) return;
         
         const parentPath = data.parentPath;
         const items = data?.items || [];
@@ -617,12 +620,33 @@ export class TagContextMenu extends DynamicContextMenu {
     async searchTags(query) {
         this.currentWord = query;
         let suggestions = [];
+        // A newer keystroke aborts the previous request, the channel lets the server drop it too
+        this.searchAbort?.abort();
+        this.searchAbort = new AbortController();
+        const { signal } = this.searchAbort;
+        this.searchChannel ??= Math.random().toString(36).slice(2);
         try {
-            const response = await fetch(`/erenodes/search_tags?query=${encodeURIComponent(query)}&limit=20`);
+            const response = await fetch(`/erenodes/search_tags?query=${encodeURIComponent(query)}&limit=20&mode=rank&channel=${this.searchChannel}`, { signal });
             if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
-            const tags = await response.json();
+            let tags = await response.json();
+            // The dictionary is still loading on the server, show that and retry shortly
+            if (tags.length === 0) {
+                const status = await (await fetch('/erenodes/tags_status')).json();
+                if (status.state === 'loading') {
+                    this.options = [{ type: 'title', name: 'Loading tag dictionary...' }];
+                    this.renderItems();
+                    setTimeout(() => { if (this.root && this.currentWord === query) this.searchTags(query); }, 500);
+                    return;
+                }
+            }
+            // Nothing contains the query, fall back to typo-tolerant matches
+            if (tags.length === 0 && query.length >= 3) {
+                const fuzzyResponse = await fetch(`/erenodes/search_tags?query=${encodeURIComponent(query)}&limit=20&mode=fuzzy&channel=${this.searchChannel}`, { signal });
+                if (fuzzyResponse.ok) tags = await fuzzyResponse.json();
+            }
             suggestions = tags.filter(tag => !this.existingTags.some(existingTag => existingTag.name === tag.name && existingTag.type === 'tag'));
         } catch (error) {
+            if (error.name === 'AbortError') return;
             console.error("[EreNodes] Error searching tags:", error);
         }
         this.updateOptions(suggestions);
@@ -886,7 +910,7 @@ export class TagEditContextMenu extends DynamicContextMenu {
 
         // show preview
         if (this.isSpecialType) {
-            this.showPreview(`/erenodes/view/${this.tag.type}/${this.tag.name}`);
+            this.showPreview(previewUrl(this.tag.type, this.tag.name, PREVIEW_SIZES.menu));
         }
 
     }
@@ -1,6 +1,6 @@
 import { app } from "../../scripts/app.js";
 import { TagContextMenuInsert, TagEditContextMenu, TagGroupContextMenu, DynamicContextMenu } from "./js/contextmenu.js";
-import { getCache, updateCache, clearCache } from "./js/cache.js";
+import { getCache, updateCache, clearCache, prefetchTagGroups } from "./js/cache.js";
 
 
 const parseTags = value => {
@@ -939,6 +939,9 @@ export function initializeSharedPromptFunctions(node, textWidget) {
         }
         const activeTags = tagData.filter(t => (t.active && t.name) );
 
+        // One request for all referenced groups instead of one per group
+        await prefetchTagGroups(activeTags.filter(t => t.type === 'group').map(t => t.extension ? `${t.name}${t.extension}` : t.name));
+
         let tagSeparator = (node.properties._tagSeparator || ", ").replace(/\\n/g, "\n");
 
         const parts = [];
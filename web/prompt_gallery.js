@@ -1,6 +1,43 @@
 import { app } from "../../scripts/app.js";
 import { initializeSharedPromptFunctions, applyContextMenuPatch } from "./prompt.js";
-import { getCache } from "./js/cache.js";
+import { getCache, previewUrl, previewListingUrl, splitPreviewPath, PREVIEW_SIZES } from "./js/cache.js";
+
+// Listings being fetched, so each gets one redraw callback
+const pendingListings = new WeakSet();
+
+// Whether each pill has a preview image, from one listing per folder naming
+// just the pills in it, instead of an image request per pill. Pills whose
+// listing is still loading are left out.
+function previewAvailability(node, pills) {
+    const folders = new Map();
+    for (const p of pills) {
+        const { folder, name } = splitPreviewPath(p.label);
+        const key = `${p.type}\n${folder}`;
+        if (!folders.has(key)) folders.set(key, { type: p.type, folder, names: new Set(), pills: [] });
+        const entry = folders.get(key);
+        entry.names.add(name);
+        entry.pills.push(p);
+    }
+
+    const available = new Map();
+    for (const { type, folder, names, pills: folderPills } of folders.values()) {
+        const listing = getCache(previewListingUrl(type, folder, names), 'json');
+        if (listing instanceof Promise) {
+            if (!pendingListings.has(listing)) {
+                pendingListings.add(listing);
+                const redraw = () => node.setDirtyCanvas(true, true);
+                listing.then(redraw, redraw);
+            }
+            continue;
+        }
+        // No listing, probe the images themselves
+        const withPreview = Array.isArray(listing?.items)
+            ? new Set(listing.items.filter(item => item.preview).map(item => item.path))
+            : null;
+        for (const p of folderPills) available.set(p, withPreview ? withPreview.has(p.label) : true);
+    }
+    return available;
+}
 
 app.registerExtension({
     name: "ErePromptGallery",
@@ -180,9 +217,10 @@ app.registerExtension({
 
             // Check if all images are cached (either exist or not)
             const imagesToLoad = [];
+            const available = previewAvailability(this, positions.filter(p => p.type === 'lora' || p.type === 'group' || p.type === 'embedding'));
             for (const p of positions) {
-                if (p.type === 'lora' || p.type === 'group' || p.type === 'embedding') {
-                    const imageUrl = `/erenodes/view/${p.type}/${p.label}`;
+                if (available.get(p)) {
+                    const imageUrl = previewUrl(p.type, p.label, PREVIEW_SIZES.gallery);
                     p.imageUrl = imageUrl; // Store for later drawing
 
                     // Only load if not cached yet (undefined), skip if cached (including notFound)